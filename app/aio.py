@@ -0,0 +1,248 @@
+#!/usr/bin/python3
+"""Asyncio variant of the read-heavy pages, served over ASGI:
+
+    hypercorn aio:application --bind 0.0.0.0:8000
+
+The list and search pages, their ``/api`` JSON, ``/analytics/sales``, ``/pool/stats``,
+``/metrics`` and ``/ping`` are Quart views on an ``AsyncConnectionPool``, so one process keeps
+serving other requests while a query is in flight, and the independent
+queries of one request (a search page and its count, the two sales reports)
+run at the same time on separate connections. Every other URL, the forms and
+the writes, is passed on to the synchronous Flask app in ``app.py``, which
+runs in a thread pool with its own connection pool.
+
+The async views are not behind the page cache: it is built on Flask's
+request context. Writes still invalidate it for the Flask views.
+They also read from the primary only; ``DATABASE_REPLICA_URLS`` applies to
+the Flask views.
+"""
+from hypercorn.middleware import AsyncioWSGIMiddleware
+from psycopg.rows import namedtuple_row
+from psycopg.rows import tuple_row
+from quart import jsonify
+from quart import Quart
+from quart import redirect
+from quart import render_template
+from quart import request
+from quart import url_for
+from werkzeug.exceptions import HTTPException
+
+from analytics import sales_report_async
+from api import page_body_async, search_body_async
+from counts import table_count_async
+from app import app as wsgi_app
+from app import cache as wsgi_cache
+from app import catalog as wsgi_catalog
+from app import all_pools as wsgi_pools
+from app import pages
+from app import pool as wsgi_pool
+from app import read_pool as wsgi_read_pool
+from app import search_total
+from db import PREPARE, create_async_pool, pool_settings
+from instrument import current_trace, end_trace, start_trace
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE
+from metrics import IN_FLIGHT, observe_request
+from metrics import render as render_metrics
+from pagination import fetch_page_async
+from search import search_async
+
+
+# Uploads to /import/<entity> are buffered by the WSGI bridge.
+WSGI_MAX_BODY_SIZE = 64 * 1024 * 1024
+
+pool = create_async_pool()
+
+app = Quart(__name__)
+app.secret_key = wsgi_app.secret_key  # flashed messages cross between the two apps
+
+
+@app.before_serving
+async def open_pools():
+    await pool.open()
+
+
+@app.after_serving
+async def close_pools():
+    await pool.close()
+    wsgi_catalog.close()
+    wsgi_read_pool.close()
+    wsgi_pool.close()
+
+
+@app.before_request
+async def start_request_trace():
+    start_trace(request.endpoint)
+    IN_FLIGHT.inc()
+
+
+@app.after_request
+async def add_server_timing(response):
+    trace = current_trace()
+    if trace is not None:
+        trace.status = response.status_code
+        response.headers["Server-Timing"] = trace.server_timing()
+    return response
+
+
+@app.teardown_request
+async def end_request_trace(error=None):
+    trace = end_trace()
+    if trace is not None:
+        IN_FLIGHT.dec()
+        observe_request(request.endpoint, request.method, trace.status or 500, trace)
+
+
+async def listing(entity, select, keys):
+    """One page of a list, or of search results when ``?query=`` is given."""
+    query = request.args.get("query")
+    if query and query.strip():
+        results = await search_async(
+            pool, entity, query, request.args.get("page", 1, type=int),
+            prepare=PREPARE, row_factory=namedtuple_row,
+        )
+        return query, None, results, search_total(results), results.items
+
+    async with pool.connection() as conn:
+        async with conn.cursor(row_factory=namedtuple_row) as cur:
+            page = await fetch_page_async(cur, select, keys, request.args.get("cursor"), prepare=PREPARE)
+            total = await table_count_async(cur, entity, prepare=PREPARE)
+    return query, page, None, total, page.items
+
+
+def wants_json():
+    accept = request.accept_mimetypes
+    return accept["application/json"] and not accept["text/html"]
+
+
+async def api_response(entity):
+    """``app.api_response``: a listing as JSON built by Postgres."""
+    query = request.args.get("query")
+    if query and query.strip():
+        body = await search_body_async(pool, entity, query, request.args.get("page", 1, type=int), prepare=PREPARE)
+    else:
+        async with pool.connection() as conn:
+            async with conn.cursor(row_factory=tuple_row) as cur:
+                body = await page_body_async(cur, entity, request.args.get("cursor"), prepare=PREPARE)
+    return body, 200, {"Content-Type": "application/json"}
+
+
+async def render_listing(template, name, query, page, results, total, items):
+    return await render_template(
+        template, **{name: items}, page=page, search=results, isSearch=results is not None,
+        query=query, numberSearch=total.value, total=total, pages=pages(total, results),
+    )
+
+
+@app.route("/", methods=("GET",))
+@app.route("/clients", methods=("GET",))
+@app.route("/clients/<int:page_number>", methods=("GET",))
+async def client_index(page_number=None):
+    if page_number is not None:
+        return redirect(url_for("client_index", **request.args))
+    if wants_json():
+        return await api_response("clients")
+    query, page, results, total, clients = await listing(
+        "customer", "SELECT cust_no, name, address, phone FROM customer", [("cust_no", "cust_no")]
+    )
+    return await render_listing("client/index.html", "clients", query, page, results, total, clients)
+
+
+@app.route("/products", methods=("GET",))
+@app.route("/products/<int:page_number>", methods=("GET",))
+async def product_index(page_number=None):
+    if page_number is not None:
+        return redirect(url_for("product_index", **request.args))
+    if wants_json():
+        return await api_response("products")
+    query, page, results, total, products = await listing(
+        "product", "SELECT SKU, name, description, price, ean FROM product", [("name", "name"), ("sku", "sku")]
+    )
+    return await render_listing("product/index.html", "products", query, page, results, total, products)
+
+
+@app.route("/supplier", methods=("GET",))
+@app.route("/supplier/<int:page_number>", methods=("GET",))
+async def supplier_index(page_number=None):
+    if page_number is not None:
+        return redirect(url_for("supplier_index", **request.args))
+    if wants_json():
+        return await api_response("suppliers")
+    query, page, results, total, suppliers = await listing(
+        "supplier", "SELECT sku, address, name, tin, date FROM supplier", [("tin", "tin")]
+    )
+    return await render_listing("supply/index.html", "supliers", query, page, results, total, suppliers)
+
+
+@app.route("/orders", methods=("GET",))
+@app.route("/orders/<int:page_number>", methods=("GET",))
+async def order_index(page_number=None):
+    if page_number is not None:
+        return redirect(url_for("order_index", **request.args))
+    if wants_json():
+        return await api_response("orders")
+    query, page, results, total, orders = await listing(
+        "orders",
+        """
+        SELECT o.order_no, o.cust_no, o.date, p.order_no IS NOT NULL AS is_paid, t.total, t.items
+        FROM orders o
+        LEFT JOIN pay p ON o.order_no = p.order_no
+        LEFT JOIN order_totals t ON o.order_no = t.order_no
+        """,
+        [("o.order_no", "order_no")],
+    )
+    return await render_listing("order/index.html", "orders", query, page, results, total, orders)
+
+
+@app.route("/api/<any(clients, products, suppliers, orders):entity>", methods=("GET",))
+async def api_listing(entity):
+    return await api_response(entity)
+
+
+@app.route("/analytics/sales", methods=("GET",))
+async def analytics_sales():
+    year = request.args.get("year", type=int)
+    if year is None:
+        return jsonify({"status": "error", "message": "Year is required!"}), 400
+    return jsonify(await sales_report_async(pool, year, request.args.getlist("sku")))
+
+
+@app.route("/pool/stats", methods=("GET",))
+async def pool_stats():
+    return jsonify({"settings": {k: v for k, v in pool_settings().items() if k != "kwargs"}, **pool.get_stats()})
+
+
+@app.route("/metrics", methods=("GET",))
+async def metrics():
+    body = render_metrics({**wsgi_pools(), "async": pool}, wsgi_cache)
+    return body, 200, {"Content-Type": METRICS_CONTENT_TYPE}
+
+
+@app.route("/ping", methods=("GET",))
+async def ping():
+    return jsonify({"message": "pong!", "status": "success"})
+
+
+# The Flask-only endpoints are registered without a view so that url_for()
+# in the shared templates can still build their URLs.
+for rule in wsgi_app.url_map.iter_rules():
+    if rule.endpoint not in app.view_functions:
+        app.add_url_rule(rule.rule, rule.endpoint, methods=rule.methods)
+
+wsgi = AsyncioWSGIMiddleware(wsgi_app, max_body_size=WSGI_MAX_BODY_SIZE)
+
+
+def is_async(scope):
+    adapter = app.url_map.bind("localhost")
+    try:
+        endpoint, _ = adapter.match(scope["path"], method=scope["method"])
+    except HTTPException:
+        return True  # redirects and errors are answered by Quart
+    return endpoint in app.view_functions
+
+
+async def application(scope, receive, send):
+    """ASGI entry point: async views in Quart, everything else in Flask."""
+    if scope["type"] == "http" and not is_async(scope):
+        await wsgi(scope, receive, send)
+    else:
+        await app(scope, receive, send)
@@ -0,0 +1,194 @@
+"""Sales analytics answered from the pre-aggregated ``sales_cube``.
+
+The questions are the two OLAP queries of section 5 of the project: quantity
+and value per product globally, by city, month, day of month and weekday;
+and the average daily sales value globally, per month and per weekday. Both
+read ``sales_cube`` (one row per day, product and city) joined to the integer
+keyed ``date_dim``. Results are cached in process and reused until the
+version in ``sales_cube_versions`` shows that sales changed. It commits with
+the sales, so the version is read before and after a report is computed and
+the report is only cached when both agree: it then reflects exactly that
+version, even under READ COMMITTED and on a replica.
+
+The customer leaderboard replaces the notebook's "highest total paid orders"
+query and reads the paid revenue sums kept by migration 0009: overall from
+``customer_revenue`` in index order, or summed from
+``customer_revenue_daily`` over the requested dates.
+"""
+import asyncio
+import datetime
+import threading
+from collections import OrderedDict
+
+from psycopg.rows import dict_row
+
+
+CACHE_SIZE = 128
+
+# GROUPING(city, month, day_of_month, day_of_week) bitmask -> dimension
+DIMENSIONS = {15: "global", 7: "city", 11: "month", 13: "day_of_month", 14: "day_of_week"}
+# GROUPING(month, day_of_week) bitmask -> dimension
+AVERAGE_DIMENSIONS = {3: "global", 1: "month", 2: "day_of_week"}
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+PRODUCT_SALES = """
+    SELECT c.sku, NULLIF(c.city, '') AS city, d.month, d.day_of_month, d.day_of_week,
+        GROUPING(c.city, d.month, d.day_of_month, d.day_of_week) AS grouping,
+        SUM(c.qty) AS total_qty, SUM(c.total_value) AS total_value
+    FROM sales_cube c
+        JOIN date_dim d ON d.date_key = c.date_key
+    WHERE c.date_key BETWEEN %(first)s AND %(last)s
+        AND (%(skus)s::VARCHAR[] IS NULL OR c.sku = ANY(%(skus)s))
+    GROUP BY GROUPING SETS (
+        (c.sku), (c.sku, c.city), (c.sku, d.month), (c.sku, d.day_of_month), (c.sku, d.day_of_week)
+    )
+    ORDER BY c.sku, c.city, d.month, d.day_of_month, d.day_of_week;
+"""
+
+AVERAGE_DAILY_SALES = """
+    WITH daily AS (
+        SELECT d.date_key, d.month, d.day_of_week, COALESCE(SUM(c.total_value), 0) AS total_value
+        FROM date_dim d
+            LEFT JOIN sales_cube c ON c.date_key = d.date_key
+                AND (%(skus)s::VARCHAR[] IS NULL OR c.sku = ANY(%(skus)s))
+        WHERE d.date_key BETWEEN %(first)s AND %(last)s
+        GROUP BY d.date_key, d.month, d.day_of_week
+    )
+    SELECT month, day_of_week, GROUPING(month, day_of_week) AS grouping,
+        AVG(total_value) AS average_value
+    FROM daily
+    GROUP BY GROUPING SETS ((month), (day_of_week), ())
+    ORDER BY month, day_of_week;
+"""
+
+VERSION = "SELECT SUM(version) AS version FROM sales_cube_versions;"
+
+TOP_CUSTOMERS = """
+    SELECT r.cust_no, c.name, r.orders, r.revenue
+    FROM customer_revenue r
+        JOIN customer c ON c.cust_no = r.cust_no
+    ORDER BY r.revenue DESC, r.cust_no
+    LIMIT %(limit)s;
+"""
+
+TOP_CUSTOMERS_BETWEEN = """
+    WITH top AS (
+        SELECT cust_no, SUM(orders) AS orders, SUM(revenue) AS revenue
+        FROM customer_revenue_daily
+        WHERE date BETWEEN %(first)s AND %(last)s
+        GROUP BY cust_no
+        ORDER BY revenue DESC, cust_no
+        LIMIT %(limit)s
+    )
+    SELECT top.cust_no, c.name, top.orders, top.revenue
+    FROM top
+        JOIN customer c ON c.cust_no = top.cust_no
+    ORDER BY top.revenue DESC, top.cust_no;
+"""
+
+
+def _params(year, skus):
+    return {"first": year * 10000 + 101, "last": year * 10000 + 1231, "skus": skus}
+
+
+def _label(rows, dimensions):
+    for row in rows:
+        row["dimension"] = dimensions[row.pop("grouping")]
+    return rows
+
+
+def _report_key(year, skus):
+    skus = sorted(set(skus)) if skus else None
+    return skus, (year, tuple(skus) if skus else None)
+
+
+def _cached(key, version):
+    with _cache_lock:
+        cached = _cache.get(key)
+        if cached and cached[0] == version:
+            _cache.move_to_end(key)
+            return cached[1]
+    return None
+
+
+def _store(key, version, report):
+    with _cache_lock:
+        _cache[key] = (version, report)
+        _cache.move_to_end(key)
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+
+
+def product_sales(cur, year, skus=None):
+    """Quantity and value per product, alone and by each dimension."""
+    rows = cur.execute(PRODUCT_SALES, _params(year, skus)).fetchall()
+    return _label(rows, DIMENSIONS)
+
+
+def average_daily_sales(cur, year, skus=None):
+    """Average value sold per day, over every day of the year (sales or not)."""
+    rows = cur.execute(AVERAGE_DAILY_SALES, _params(year, skus)).fetchall()
+    return _label(rows, AVERAGE_DIMENSIONS)
+
+
+def sales_report(conn, year, skus=None):
+    """Both reports for ``year`` (optionally only ``skus``), cached per version."""
+    skus, key = _report_key(year, skus)
+    with conn.cursor(row_factory=dict_row) as cur:
+        version = cur.execute(VERSION).fetchone()["version"]
+        report = _cached(key, version)
+        if report is not None:
+            return report
+
+        report = {
+            "year": year,
+            "skus": skus,
+            "product_sales": product_sales(cur, year, skus),
+            "average_daily_sales": average_daily_sales(cur, year, skus),
+        }
+        unchanged = cur.execute(VERSION).fetchone()["version"] == version
+    if unchanged:
+        _store(key, version, report)
+    return report
+
+
+async def sales_report_async(pool, year, skus=None):
+    """``sales_report`` over an ``AsyncConnectionPool``, running the two
+    reports concurrently on separate connections."""
+    skus, key = _report_key(year, skus)
+
+    async def fetch(sql, params=None):
+        async with pool.connection() as conn:
+            async with conn.cursor(row_factory=dict_row) as cur:
+                await cur.execute(sql, params)
+                return await cur.fetchall()
+
+    version = (await fetch(VERSION))[0]["version"]
+    report = _cached(key, version)
+    if report is not None:
+        return report
+
+    params = _params(year, skus)
+    sales, averages = await asyncio.gather(fetch(PRODUCT_SALES, params), fetch(AVERAGE_DAILY_SALES, params))
+    report = {
+        "year": year,
+        "skus": skus,
+        "product_sales": _label(sales, DIMENSIONS),
+        "average_daily_sales": _label(averages, AVERAGE_DIMENSIONS),
+    }
+    if (await fetch(VERSION))[0]["version"] == version:
+        _store(key, version, report)
+    return report
+
+
+def top_customers(conn, limit=10, first=None, last=None):
+    """The ``limit`` customers who paid the most, for orders dated from
+    ``first`` to ``last`` (inclusive, either may be open)."""
+    with conn.cursor(row_factory=dict_row) as cur:
+        if first is None and last is None:
+            return cur.execute(TOP_CUSTOMERS, {"limit": limit}).fetchall()
+        params = {"first": first or datetime.date.min, "last": last or datetime.date.max, "limit": limit}
+        return cur.execute(TOP_CUSTOMERS_BETWEEN, params).fetchall()
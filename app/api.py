@@ -0,0 +1,97 @@
+"""JSON bodies for the list and search pages, serialized by Postgres.
+
+Each row's JSON object is built in the select list (``json_build_object``),
+so a page is fetched as one text column per row, plus the sort key the
+cursors need, and the response body is those strings joined together: no
+row objects, no dicts and no encoder run per row. Derived fields such as an
+order's ``is_paid`` are computed in the same SQL.
+
+Next to the items, a page body carries its cursors and the listing's total
+(``counts.py``) and a search body its page number and capped total.
+"""
+import json
+
+from counts import table_count, table_count_async
+from pagination import fetch_page, fetch_page_async
+from search import search, search_async
+
+
+# entity -> (table, JSON object of a row, FROM clause, sort keys as
+# (expression, column index in the tuple rows))
+LISTINGS = {
+    "clients": (
+        "customer",
+        "json_build_object('cust_no', cust_no, 'name', name, 'address', address, 'phone', phone)",
+        "customer",
+        [("cust_no", 1)],
+    ),
+    "products": (
+        "product",
+        "json_build_object('sku', sku, 'name', name, 'description', description, 'price', price, 'ean', ean)",
+        "product",
+        [("name", 1), ("sku", 2)],
+    ),
+    "suppliers": (
+        "supplier",
+        "json_build_object('tin', tin, 'name', name, 'address', address, 'sku', sku, 'date', date)",
+        "supplier",
+        [("tin", 1)],
+    ),
+    "orders": (
+        "orders",
+        "json_build_object('order_no', o.order_no, 'cust_no', o.cust_no, 'date', o.date,"
+        " 'is_paid', p.order_no IS NOT NULL, 'total', t.total, 'items', t.items)",
+        "orders o LEFT JOIN pay p ON o.order_no = p.order_no LEFT JOIN order_totals t ON o.order_no = t.order_no",
+        [("o.order_no", 1)],
+    ),
+}
+
+
+def _select(entity):
+    table, obj, source, keys = LISTINGS[entity]
+    return f"SELECT {obj}::text, {', '.join(expr for expr, _ in keys)} FROM {source}"
+
+
+def _body(rows, **fields):
+    """``{"items": [...], **fields}`` with the rows' JSON pasted in as is."""
+    items = ",".join(row[0] for row in rows)
+    return f'{{"items":[{items}],{json.dumps(fields, default=str)[1:]}'.encode()
+
+
+def _page_body(page, total):
+    return _body(
+        page.items, page_number=page.page_number, next_cursor=page.next_cursor,
+        prev_cursor=page.prev_cursor, total=total.value, total_exact=total.exact,
+    )
+
+
+def _search_body(results):
+    return _body(
+        results.items, page_number=results.page_number, has_next=results.has_next,
+        total=results.total, total_capped=results.capped, total_estimate=results.estimate,
+    )
+
+
+def page_body(cur, entity, cursor=None, prepare=None):
+    """One page of ``entity`` as JSON bytes; ``cur`` must return tuples."""
+    table, _, _, keys = LISTINGS[entity]
+    page = fetch_page(cur, _select(entity), keys, cursor, prepare=prepare)
+    return _page_body(page, table_count(cur, table, prepare=prepare))
+
+
+def search_body(cur, entity, query, page_number=1, prepare=None):
+    table, obj = LISTINGS[entity][:2]
+    results = search(cur, table, query, page_number, prepare=prepare, columns=f"{obj}::text")
+    return _search_body(results)
+
+
+async def page_body_async(cur, entity, cursor=None, prepare=None):
+    table, _, _, keys = LISTINGS[entity]
+    page = await fetch_page_async(cur, _select(entity), keys, cursor, prepare=prepare)
+    return _page_body(page, await table_count_async(cur, table, prepare=prepare))
+
+
+async def search_body_async(pool, entity, query, page_number=1, prepare=None):
+    table, obj = LISTINGS[entity][:2]
+    results = await search_async(pool, table, query, page_number, prepare=prepare, columns=f"{obj}::text")
+    return _search_body(results)
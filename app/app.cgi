@@ -1,4 +1,14 @@
 #!/usr/bin/python3
+# One process per request: talk to Postgres through a single connection
+# opened only if the request needs it, rather than starting a pool, and
+# without loading the product catalog. Views import the modules only they
+# use (search, exports, imports, reports) when they run.
+# app.fcgi serves the same URLs from a persistent process.
+import os
+
+os.environ.setdefault("DB_DIRECT_CONNECTION", "1")
+os.environ.setdefault("PRODUCT_CATALOG", "0")
+
 from wsgiref.handlers import CGIHandler
 
 from app import app
@@ -1,28 +1,52 @@
 #!/usr/bin/python3
+import datetime
 import os
+import time
 from logging.config import dictConfig
 
+import csv
+import io
 import psycopg
 import json
 from flask import flash
 from flask import Flask
+from flask import g
 from flask import jsonify
+from flask import Response
 from flask import redirect
 from flask import render_template
 from flask import request
+from flask import session
+from flask import stream_with_context
 from flask import url_for
 from psycopg.rows import namedtuple_row
-from psycopg_pool import ConnectionPool
+from psycopg.rows import tuple_row
 
 import re
 
+from cache import ResponseCache
+from catalog import create_catalog
+from counts import Count, page_count, table_count
+from db import PREPARE, create_pool, create_read_pool, pool_settings
+from instrument import current_trace, end_trace, start_trace
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE
+from metrics import IN_FLIGHT, observe_request
+from metrics import render as render_metrics
+from pagination import PAGE_SIZE, fetch_page
+from validation import clean_customer, clean_product, clean_supplier
 
-# postgres://{user}:{password}@{hostname}:{port}/{database-name}
-DATABASE_URL = os.environ.get("DATABASE_URL", "postgres://p3:p3@postgres/p3")
 
+pool = create_pool(open=False)
+# The pool connects on first use, in the process that serves requests:
+# under gunicorn --preload the master imports this module and forks, and
+# connections must not be shared with the workers. See gunicorn.conf.py.
 
-pool = ConnectionPool(conninfo=DATABASE_URL)
-# the pool starts connecting immediately.
+# Read-only handlers use the replicas in DATABASE_REPLICA_URLS (or the
+# primary when there are none). For DB_READ_YOUR_WRITES seconds after a POST
+# the same client reads from the primary again, uncached, so it sees its own
+# changes however far the replicas lag.
+read_pool = create_read_pool(pool)
+READ_YOUR_WRITES = float(os.environ.get("DB_READ_YOUR_WRITES", "5"))
 
 
 dictConfig(
@@ -48,52 +72,162 @@ app = Flask(__name__)
 log = app.logger
 app.secret_key = "secret_key"
 
+# Rendered list and detail pages, invalidated per entity by the handlers
+# that write to it.
+cache = ResponseCache.from_env()
+
+# SKU -> name, price and EAN, kept current by Postgres notifications from
+# every process's writes; those also retire this process's cached product
+# and order pages (see catalog.py).
+catalog = create_catalog(on_change=lambda: cache.invalidate("products", "orders"))
+
+
+@app.before_request
+def open_pool():
+    if pool.closed:
+        pool.open()
+    if read_pool.closed:
+        read_pool.open()
+    if catalog.closed:
+        catalog.open()
+
+
+@app.before_request
+def read_own_writes():
+    if read_pool is not pool and session.get("primary_until", 0) > time.time():
+        g.read_primary = g.bypass_cache = True
+
+
+@app.after_request
+def remember_write(response):
+    if request.method == "POST" and read_pool is not pool:
+        session["primary_until"] = time.time() + READ_YOUR_WRITES
+    return response
+
+
+def reader():
+    """Pool for a read-only handler.
+
+    Pages read from a replica are served but never stored in the page cache:
+    one rendered from a replica that has not replayed a write yet would be
+    stored under the generation that write has already bumped, and then
+    served to the writer once their DB_READ_YOUR_WRITES window is over.
+    """
+    if g.get("read_primary") or read_pool is pool:
+        return pool
+    g.no_store = True
+    return read_pool
+
+
+# Every response reports the time its request spent in the database, waiting
+# for a connection and in total (see instrument.py), and every request is
+# counted in /metrics.
+@app.before_request
+def start_request_trace():
+    start_trace(request.endpoint)
+    IN_FLIGHT.inc()
+
+
+@app.after_request
+def add_server_timing(response):
+    trace = current_trace()
+    if trace is not None:
+        trace.status = response.status_code
+        response.headers["Server-Timing"] = trace.server_timing()
+    return response
+
+
+@app.teardown_request
+def end_request_trace(error=None):
+    trace = end_trace()
+    if trace is not None:
+        IN_FLIGHT.dec()
+        observe_request(request.endpoint, request.method, trace.status or 500, trace)
+        log.debug(f"{trace.statements} queries, {trace.rows} rows in {trace.db_time * 1000:.1f} ms.")
+
+
+def wants_json():
+    """API-like responses go to clients that request JSON explicitly (e.g., fetch)."""
+    return (
+        request.accept_mimetypes["application/json"]
+        and not request.accept_mimetypes["text/html"]
+    )
+
+
+def api_response(entity):
+    """One page, or one page of ``?query=`` results, of a listing as JSON
+    built by Postgres (see api.py)."""
+    from api import page_body, search_body
+
+    query = request.args.get("query")
+    with reader().connection() as conn:
+        with conn.cursor(row_factory=tuple_row) as cur:
+            if query and query.strip():
+                body = search_body(cur, entity, query, request.args.get("page", 1, type=int), prepare=PREPARE)
+            else:
+                body = page_body(cur, entity, request.args.get("cursor"), prepare=PREPARE)
+    return Response(body, content_type="application/json")
+
+
+def search_total(results):
+    """``counts.Count`` of a search's matches."""
+    return Count(results.estimate, not results.capped)
+
+
+def pages(total, results=None):
+    """Number of pages for "page X of Y"; search pages stop at MAX_RESULTS."""
+    return page_count(results.total if results else total.value, PAGE_SIZE)
+
 
 @app.route("/", methods=("GET",))
 @app.route("/clients", methods=("GET",))
 @app.route("/clients/<int:page_number>", methods=("GET",))
-def client_index(page_number=1):
+@cache.cached("clients")
+def client_index(page_number=None):
     """Show all the accounts, most recent first."""
 
-    if page_number < 1:
-        return redirect("/clients/1")
+    if page_number is not None:
+        # Numbered pages were replaced by cursors; old links land on page 1.
+        return redirect(url_for("client_index", **request.args))
+    if wants_json():
+        return api_response("clients")
 
     query = request.args.get('query')
     isSearch=False
-    limit = 5  # Set the limit to the desired number of items per page
-    offset = (page_number - 1) * limit  # Calculate the offset based on the current page number
-     
+    page = results = None
+
     if not query: 
-        with pool.connection() as conn:
+        with reader().connection() as conn:
             with conn.cursor(row_factory=namedtuple_row) as cur:
-                clients = cur.execute(
+                page = fetch_page(
+                    cur,
                     """
                     SELECT cust_no, name, address, phone
                     FROM customer
-                    ORDER BY cust_no
-                    LIMIT %s OFFSET %s;
                     """,
-                    (limit, offset),
-                ).fetchall()
-                log.debug(f"Found {cur.rowcount} rows.")
+                    [("cust_no", "cust_no")],
+                    request.args.get("cursor"),
+                    prepare=PREPARE,
+                )
+                clients = page.items
+                total = table_count(cur, "customer", prepare=PREPARE)
+                log.debug(f"Found {len(clients)} of {total.value} rows.")
     else: 
         isSearch=True
-        with pool.connection() as conn:
+        from search import search
+
+        with reader().connection() as conn:
             with conn.cursor(row_factory=namedtuple_row) as cur:
-                clients = cur.execute("SELECT cust_no, name, address, phone FROM customer WHERE LOWER(name) LIKE LOWER(%s) OR phone LIKE %s OR cust_no::text LIKE %s",  ('%' + query + '%', '%' + query + '%', '%' + query + '%')
-                ).fetchall()
-                log.debug(f"Found {cur.rowcount} rows.")
+                results = search(cur, "customer", query, request.args.get("page", 1, type=int), prepare=PREPARE)
+                clients = results.items
+                total = search_total(results)
+                log.debug(f"Found {total.value} rows.")
 
-    # API-like response is returned to clients that request JSON explicitly (e.g., fetch)
-    if (
-        request.accept_mimetypes["application/json"]
-        and not request.accept_mimetypes["text/html"]
-    ):
-        return jsonify(clients)
-    numberSearch = len(clients)
-    return render_template("client/index.html", clients=clients, page_number=page_number,isSearch=isSearch,query=query,numberSearch=numberSearch)
+    numberSearch = total.value
+    return render_template("client/index.html", clients=clients, page=page,search=results,isSearch=isSearch,query=query,numberSearch=numberSearch,total=total,pages=pages(total, results))
 
 @app.route("/clients/<client_number>/update", methods=("GET",))
+@cache.cached("clients")
 def client_update(client_number=-1):
     """View, or delete, or create an account."""
     
@@ -101,7 +235,7 @@ def client_update(client_number=-1):
         return redirect(client_index)
     
 
-    with pool.connection() as conn:
+    with reader().connection() as conn:
         with conn.cursor(row_factory=namedtuple_row) as cur:
             client = cur.execute(
                 """
@@ -110,6 +244,7 @@ def client_update(client_number=-1):
                 WHERE cust_no = %(account_number)s;
                 """,
                 {"account_number": client_number},
+                prepare=PREPARE,
             ).fetchone()
             log.debug(f"Found {cur.rowcount} rows.")
 
@@ -134,20 +269,11 @@ def client_create():
         elif all([add == "" for add in [addressS,addressZ,addressC]]): 
             address = None
         else:
+            address = None
             error = "Address is incomplete!"
 
-        if not name:
-            error = "Name is required!"
-        if not email:
-            error = "Email is required!"
-        if "@" not in email or "." not in email:
-            error = "Email is invalid!"
-            
-        if phone:
-            if phone.isnumeric() == False:
-                error = "Phone must be a number!"
-
-        
+        values, invalid = clean_customer(name, email, phone, address)
+        error = invalid or error
 
         if error is not None:
             flash(error)
@@ -156,14 +282,18 @@ def client_create():
                 with pool.connection() as conn:
                     with conn.cursor(row_factory=namedtuple_row) as cur:
                         conn.autocommit = False
-                        cur.execute(
+                        cust_no = cur.execute(
                             """
-                            INSERT INTO customer (cust_no, name, address, phone, email)
-                            SELECT COALESCE(MAX(cust_no), 0) + 1, %(name)s, %(address)s, %(phone)s, %(email)s FROM customer;
+                            INSERT INTO customer (name, address, phone, email)
+                            VALUES (%(name)s, %(address)s, %(phone)s, %(email)s)
+                            RETURNING cust_no;
                             """,
-                            {"name": name, "address": address, "phone": phone, "email": email},
-                        )
+                            values,
+                            prepare=PREPARE,
+                        ).fetchone().cust_no
+                        log.debug(f"Created customer {cust_no}.")
                     conn.commit()
+                cache.invalidate("clients")
                 return redirect(url_for("client_index"))
             except psycopg.DatabaseError as error:
                 error_message = str(error)
@@ -213,56 +343,72 @@ def client_delete(client_number):
                 (num,)
             )
         conn.commit()
+    cache.invalidate("clients", "orders")
     return redirect(url_for("client_index"))
 
 @app.route("/products", methods=("GET",))
 @app.route("/products/<int:page_number>", methods=("GET",))
-def product_index(page_number=1):
+@cache.cached("products")
+def product_index(page_number=None):
     """Show all the products, most recent first."""
 
-    if page_number < 1:
-        return redirect("/products/1")
+    if page_number is not None:
+        return redirect(url_for("product_index", **request.args))
+    if wants_json():
+        return api_response("products")
     query = request.args.get('query')
     isSearch= False
-    limit = 5  # Set the limit to the desired number of items per page
-    offset = (page_number - 1) * limit  # Calculate the offset based on the current page number
+    page = results = None
     if not query or query == " ":
-        with pool.connection() as conn:
+        with reader().connection() as conn:
             with conn.cursor(row_factory=namedtuple_row) as cur:
-                products = cur.execute(
+                # sku breaks ties between products sharing a name
+                page = fetch_page(
+                    cur,
                     """
                     SELECT SKU, name, description, price, ean
                     FROM product
-                    ORDER BY name
-                    LIMIT %s OFFSET %s;
                     """,
-                    (limit, offset),
-                ).fetchall()
-                log.debug(f"Found {cur.rowcount} rows.")
+                    [("name", "name"), ("sku", "sku")],
+                    request.args.get("cursor"),
+                    prepare=PREPARE,
+                )
+                products = page.items
+                total = table_count(cur, "product", prepare=PREPARE)
+                log.debug(f"Found {len(products)} of {total.value} rows.")
     else:
         isSearch=True
-        with pool.connection() as conn:
+        from search import search
+
+        with reader().connection() as conn:
             with conn.cursor(row_factory=namedtuple_row) as cur:
-                products = cur.execute("SELECT sku, name, description, price, ean FROM product WHERE LOWER(name) LIKE LOWER(%s) OR price::text LIKE %s OR LOWER(sku) LIKE LOWER(%s) OR ean::text LIKE %s",  ('%' + query + '%', '%' + query + '%', '%' + query + '%','%' + query + '%')
-                ).fetchall()
-                log.debug(f"Found {cur.rowcount} rows.")
+                results = search(cur, "product", query, request.args.get("page", 1, type=int), prepare=PREPARE)
+                products = results.items
+                total = search_total(results)
+                log.debug(f"Found {total.value} rows.")
                 
-    # API-like response is returned to clients that request JSON explicitly (e.g., fetch)
-    if (
-        request.accept_mimetypes["application/json"]
-        and not request.accept_mimetypes["text/html"]
-    ):
-        return jsonify(products)
-    numberSearch = len(products)
-    return render_template("product/index.html", products=products, page_number=page_number,isSearch=isSearch,query=query,numberSearch=numberSearch)
+    numberSearch = total.value
+    return render_template("product/index.html", products=products, page=page,search=results,isSearch=isSearch,query=query,numberSearch=numberSearch,total=total,pages=pages(total, results))
+
+
+@app.route("/products/complete", methods=("GET",))
+def product_complete():
+    """Products whose SKU or name starts with ``?prefix=``, for the order form."""
+    prefix = request.args.get("prefix", "").strip()
+    if not prefix:
+        return jsonify([])
+    limit = min(request.args.get("limit", 10, type=int), 50)
+    products = catalog.complete(reader(), prefix, limit)
+    return jsonify([product._asdict() for product in products])
 
 
 @app.route("/product/<string:product_sku>/update",methods =("GET", "POST"))
+@cache.cached("products")
 def product_update(product_sku):
     """View, or delete, or edit a product."""
     
     if request.method == "GET":
-        with pool.connection() as conn:
+        with reader().connection() as conn:
             with conn.cursor(row_factory=namedtuple_row) as cur:
                 product = cur.execute(
                     """
@@ -271,6 +417,7 @@ def product_update(product_sku):
                     WHERE SKU = %(sku)s;
                     """,
                     {"sku": product_sku},
+                    prepare=PREPARE,
                 ).fetchone()
                 log.debug(f"Found {cur.rowcount} rows.")
     
@@ -295,8 +442,11 @@ def product_update(product_sku):
                         WHERE SKU = %(product_sku)s;
                         """,
                         {"product_sku": product_sku, "price": price, "description": description},
+                        prepare=PREPARE,
                     )
                 conn.commit()
+            # a new price changes the order totals on the order pages
+            cache.invalidate("products", "orders")
             return redirect(url_for("product_index"))
 
     return render_template("product/update.html", product=product)
@@ -313,26 +463,7 @@ def product_create():
         price = request.form["price"]
         ean = request.form["ean"]
 
-        error = None
-
-        if ean == "":
-            ean = None
-
-        if not name:
-            error = "Name is required!"
-        if not price:
-            error = "Price is required!"
-        try:
-            price = float(price)
-        except:
-            error = "Price must be a float"
-        if not sku:
-            error = "SKU is required!"
-        if not description:
-            description = ""
-        
-
-        
+        values, error = clean_product(sku, name, description, price, ean)
 
         if error is not None:
             flash(error)
@@ -343,11 +474,13 @@ def product_create():
                         cur.execute(
                             """
                             INSERT INTO product (SKU, name, description, price, ean)
-                            VALUES (%(SKU)s, %(name)s, %(description)s, %(price)s, %(ean)s);
+                            VALUES (%(sku)s, %(name)s, %(description)s, %(price)s, %(ean)s);
                             """,
-                            {"SKU": sku, "name": name, "description": description, "price": price, "ean": ean},
+                            values,
+                            prepare=PREPARE,
                         )
                     conn.commit()
+                cache.invalidate("products")
                 return redirect(url_for("product_index"))
             except psycopg.DatabaseError as error:
                 error_message = str(error)
@@ -364,19 +497,55 @@ def product_create():
 
     return render_template("product/create_product.html")
 
+# Orders containing a product are deleted with it. Above this many orders
+# the cascade runs in batches of this size, each in its own transaction, so
+# locks on orders/pay/process are held per batch rather than for the whole
+# cascade. 0 deletes everything in a single transaction.
+PRODUCT_DELETE_BATCH_SIZE = int(os.environ.get("PRODUCT_DELETE_BATCH_SIZE", "0"))
+
+
+def delete_product_orders(cur, sku, limit=None):
+    """Delete (up to ``limit``) orders containing ``sku`` with their lines,
+    payment and processing rows, returning how many orders were deleted.
+
+    The sub-statements share one snapshot and the foreign keys are checked
+    once the whole statement is done, so children and parents go together.
+    """
+    cur.execute(
+        """
+        WITH doomed AS (
+            SELECT order_no FROM contains WHERE sku = %(sku)s LIMIT %(limit)s
+        ), deleted_contains AS (
+            DELETE FROM contains WHERE order_no IN (SELECT order_no FROM doomed)
+        ), deleted_pay AS (
+            DELETE FROM pay WHERE order_no IN (SELECT order_no FROM doomed)
+        ), deleted_process AS (
+            DELETE FROM process WHERE order_no IN (SELECT order_no FROM doomed)
+        )
+        DELETE FROM orders WHERE order_no IN (SELECT order_no FROM doomed);
+        """,
+        {"sku": sku, "limit": limit},
+    )
+    return cur.rowcount
+
+
 @app.route("/product/<string:product_sku>/delete",methods =("POST",))
 def product_delete(product_sku):
     sk = product_sku
     with pool.connection() as conn:
         with conn.cursor() as cur:
-            cur.execute("SELECT order_no FROM contains WHERE sku = %s", (sk,))
-            orders = cur.fetchall()
+            if PRODUCT_DELETE_BATCH_SIZE > 0:
+                while delete_product_orders(cur, sk, PRODUCT_DELETE_BATCH_SIZE):
+                    conn.commit()
+                    cache.invalidate("orders")
 
-            for order in orders: 
-                cur.execute("DELETE FROM contains WHERE order_no = %s", (order[0],))
-                cur.execute("DELETE FROM pay WHERE order_no = %s", (order[0],))
-                cur.execute("DELETE FROM process WHERE order_no = %s", (order[0],))
-                cur.execute("DELETE FROM orders WHERE order_no = %s", (order[0],))
+            # From here on, orders and suppliers that would reference the
+            # product wait for this transaction (their foreign key check
+            # locks the row), so it cannot gain new references before it is
+            # deleted; orders added while the batches ran are deleted here.
+            cur.execute("SELECT 1 FROM product WHERE sku = %s FOR UPDATE;", (sk,))
+            deleted = delete_product_orders(cur, sk)
+            log.debug(f"Deleted {deleted} orders containing {sk}.")
 
             cur.execute("""
                 DELETE FROM delivery WHERE TIN IN
@@ -387,57 +556,64 @@ def product_delete(product_sku):
             cur.execute("DELETE FROM product WHERE sku = %s", (sk,))
         
         conn.commit()
+    cache.invalidate("products", "suppliers", "orders")
     
     return redirect(url_for("product_index"))
 
 @app.route("/supplier", methods=("GET","POST",))
 @app.route("/supplier/<int:page_number>", methods=("GET","POST,"))
-def supplier_index(page_number=1):
+@cache.cached("suppliers")
+def supplier_index(page_number=None):
+    if page_number is not None:
+        return redirect(url_for("supplier_index", **request.args))
+    if wants_json():
+        return api_response("suppliers")
     error  = None
     query = request.args.get('query')
     isSearch= False
+    page = results = None
     if error is not None:
             flash(error)
-    limit = 5  # Set the limit to the desired number of items per page
-    offset = (page_number - 1) * limit  # Calculate the offset based on the current page number
     if not query or query==" ":
-        with pool.connection() as conn:
+        with reader().connection() as conn:
             with conn.cursor(row_factory=namedtuple_row) as cur:
-                supliers = cur.execute(
+                # sku is nullable and not unique, so page on the primary key
+                page = fetch_page(
+                    cur,
                     """
                     SELECT sku, address, name, tin,date
                     FROM supplier
-                    ORDER BY sku
-                    LIMIT %s OFFSET %s;
                     """,
-                    (limit, offset),
-                ).fetchall()
-                log.debug(f"Found {cur.rowcount} rows.")
+                    [("tin", "tin")],
+                    request.args.get("cursor"),
+                    prepare=PREPARE,
+                )
+                supliers = page.items
+                total = table_count(cur, "supplier", prepare=PREPARE)
+                log.debug(f"Found {len(supliers)} of {total.value} rows.")
     else:
         isSearch=True
-        with pool.connection() as conn:
+        from search import search
+
+        with reader().connection() as conn:
             with conn.cursor(row_factory=namedtuple_row) as cur:
-                supliers = cur.execute("SELECT sku, address, name, tin,date FROM supplier WHERE LOWER(name) LIKE LOWER(%s) OR tin LIKE %s OR LOWER(sku) LIKE LOWER(%s)",  ('%' + query + '%', '%' + query + '%', '%' + query + '%')
-                ).fetchall()
-                log.debug(f"Found {cur.rowcount} rows.")
+                results = search(cur, "supplier", query, request.args.get("page", 1, type=int), prepare=PREPARE)
+                supliers = results.items
+                total = search_total(results)
+                log.debug(f"Found {total.value} rows.")
 
-    # API-like response is returned to supliers that request JSON explicitly (e.g., fetch)
-    if (
-        request.accept_mimetypes["application/json"]
-        and not request.accept_mimetypes["text/html"]
-    ):
-        return jsonify(supliers)
-    numberSearch = len(supliers)
-    return render_template("supply/index.html",supliers=supliers,page_number=page_number,isSearch=isSearch,query=query,numberSearch=numberSearch)
+    numberSearch = total.value
+    return render_template("supply/index.html",supliers=supliers,page=page,search=results,isSearch=isSearch,query=query,numberSearch=numberSearch,total=total,pages=pages(total, results))
 
 @app.route("/supplier/<tin>/update", methods=("GET",))
+@cache.cached("suppliers")
 def supplier_update(tin=""):
     """View, or delete, or create an account."""
     
     if tin == "":
         return render_template("supply/index.html")
     
-    with pool.connection() as conn:
+    with reader().connection() as conn:
         with conn.cursor(row_factory=namedtuple_row) as cur:
             supplier = cur.execute(
                 """
@@ -446,6 +622,7 @@ def supplier_update(tin=""):
                 WHERE tin = %(tin)s;
                 """,
                 {"tin": tin},
+                prepare=PREPARE,
             ).fetchone()
             log.debug(f"Found {cur.rowcount} rows.")
 
@@ -474,6 +651,7 @@ def supplier_delete(tin=""):
                 (tin,),
             )
         conn.commit()
+    cache.invalidate("suppliers")
     return redirect(url_for("supplier_index"))
 
 @app.route("/supplier/register", methods=("GET","POST"))
@@ -497,17 +675,13 @@ def supplier_register():
         if all([add is not None for add in [addressS,addressZ,addressC]]):
             address = addressS + " " + addressZ + " " + addressC
         elif any([add is None for add in [addressS,addressZ,addressC]]): 
+            address = None
             error = "Address is incomplete!"
         else:
             address = None
 
-        if name == "":
-            name = None
-        if sku == "":
-            sku = None
-        if date == "":
-            date = None
-        
+        values, invalid = clean_supplier(tin, name, address, sku, date)
+        error = invalid or error
 
         if error is not None:
             flash(error)
@@ -520,9 +694,11 @@ def supplier_register():
                             INSERT INTO supplier (sku, address, name, tin, date)
                             VALUES (%(sku)s, %(address)s, %(name)s, %(tin)s, %(date)s);
                             """,
-                            {"sku": sku, "name": name, "address": address, "tin": tin, "date": date},
+                            values,
+                            prepare=PREPARE,
                         )
                     conn.commit()
+                cache.invalidate("suppliers")
                 return redirect(url_for("supplier_index"))
             except psycopg.DatabaseError as error:
                 error_message = str(error)
@@ -538,57 +714,69 @@ def supplier_register():
 
 @app.route("/orders", methods=("GET",))
 @app.route("/orders/<int:page_number>", methods=("GET",))
-def order_index(page_number=1):
+@cache.cached("orders")
+def order_index(page_number=None):
     
-    limit = 5  # Set the limit to the desired number of items per page
-    offset = (page_number - 1) * limit  # Calculate the offset based on the current page number
+    if page_number is not None:
+        return redirect(url_for("order_index", **request.args))
+    if wants_json():
+        return api_response("orders")
     query = request.args.get('query')
     isSearch= False
+    page = results = None
     if not query or query==" ":
-        with pool.connection() as conn:
+        with reader().connection() as conn:
             with conn.cursor(row_factory=namedtuple_row) as cur:
-                orders = cur.execute(
+                page = fetch_page(
+                    cur,
                     """
-                    SELECT o.order_no, o.cust_no, o.date, p.order_no AS payment_order_no
+                    SELECT o.order_no, o.cust_no, o.date, p.order_no IS NOT NULL AS is_paid, t.total, t.items
                     FROM orders o
                     LEFT JOIN pay p ON o.order_no = p.order_no
-                    ORDER BY o.order_no
-                    LIMIT %s OFFSET %s;
+                    LEFT JOIN order_totals t ON o.order_no = t.order_no
                     """,
-                    (limit, offset),
-                ).fetchall()
-                log.debug(f"Found {cur.rowcount} rows.")
+                    [("o.order_no", "order_no")],
+                    request.args.get("cursor"),
+                    prepare=PREPARE,
+                )
+                orders = page.items
+                total = table_count(cur, "orders", prepare=PREPARE)
+                log.debug(f"Found {len(orders)} of {total.value} rows.")
     else:
         isSearch=True
-        with pool.connection() as conn:
-            with conn.cursor(row_factory=namedtuple_row) as cur:
-                orders = cur.execute("SELECT o.order_no, o.cust_no, o.date, p.order_no AS payment_order_no FROM orders o LEFT JOIN pay p ON o.order_no = p.order_no WHERE p.order_no::text LIKE %s OR o.cust_no::text LIKE %s OR o.order_no::text LIKE %s OR o.date::text LIKE %s",  ('%' + query + '%', '%' + query + '%', '%' + query + '%','%' + query + '%')
-                ).fetchall()
-                log.debug(f"Found {cur.rowcount} rows.")
-           
-    # Create a list to store the orders with payment status (paid/not paid)
-    modified_orders = []
-    
-    for order in orders:
-        if order.payment_order_no is not None:
-            # Order has a corresponding payment record, indicating it has been paid
-            modified_order = dict(order._asdict())
-            modified_order['is_paid'] = True
-        else:
-            # Order does not have a corresponding payment record, indicating it has not been paid
-            modified_order = dict(order._asdict())
-            modified_order['is_paid'] = False
-        
-        modified_orders.append(modified_order)
+        from search import search
 
-    # API-like response is returned to orders that request JSON explicitly (e.g., fetch)
-    if (
-        request.accept_mimetypes["application/json"]
-        and not request.accept_mimetypes["text/html"]
-    ):
-        return jsonify(modified_orders)
-    numberSearch = len(orders)
-    return render_template("order/index.html", orders=modified_orders, page_number=page_number,isSearch=isSearch,query=query,numberSearch=numberSearch)
+        with reader().connection() as conn:
+            with conn.cursor(row_factory=namedtuple_row) as cur:
+                results = search(cur, "orders", query, request.args.get("page", 1, type=int), prepare=PREPARE)
+                orders = results.items
+                total = search_total(results)
+                log.debug(f"Found {total.value} rows.")
+
+    numberSearch = total.value
+    return render_template("order/index.html", orders=orders, page=page,search=results,isSearch=isSearch,query=query,numberSearch=numberSearch,total=total,pages=pages(total, results))
+
+@app.route("/orders/largest", methods=("GET",))
+@cache.cached("orders")
+def order_largest():
+    """Orders by value, largest first, read in index order from order_totals."""
+    with reader().connection() as conn:
+        with conn.cursor(row_factory=namedtuple_row) as cur:
+            page = fetch_page(
+                cur,
+                """
+                SELECT o.order_no, o.cust_no, o.date, p.order_no IS NOT NULL AS is_paid, t.total, t.items
+                FROM order_totals t
+                JOIN orders o ON o.order_no = t.order_no
+                LEFT JOIN pay p ON p.order_no = t.order_no
+                """,
+                [("t.total", "total"), ("t.order_no", "order_no")],
+                request.args.get("cursor"),
+                prepare=PREPARE,
+                descending=True,
+            )
+            total = table_count(cur, "order_totals", prepare=PREPARE)
+    return render_template("order/largest.html", orders=page.items, page=page, total=total, pages=pages(total))
 
 @app.route("/orders/<order_no>/pay", methods=("GET","POST"))
 def order_pay(order_no):
@@ -613,8 +801,10 @@ def order_pay(order_no):
                             VALUES (%(order_no)s, %(cust_no)s);
                             """,
                             {"cust_no": cust_no, "order_no": order_no},
+                            prepare=PREPARE,
                         )
                     conn.commit()
+                cache.invalidate("orders")
             except psycopg.errors.DatabaseError as error:
                 #flash(str(error))
                 error_message = str(error)
@@ -640,6 +830,7 @@ def order_pay(order_no):
                     SELECT cust_no FROM orders WHERE order_no = %(order_no)s;
                     """,
                     {"order_no": order_no},
+                    prepare=PREPARE,
                 ).fetchone()
             conn.commit()
     except psycopg.errors.DatabaseError as error:
@@ -675,6 +866,8 @@ def order_create():
         #flash(skus)
         if len(skus_data) == 0:
             error = ('Order is empty')
+        elif any(type(qty) is not int or qty < 1 for qty in skus_data.values()):
+            error = "Quantities must be positive whole numbers!"
         if not cust_no:
             error = "Customer Number is required!"
         if not date:
@@ -683,32 +876,45 @@ def order_create():
             flash(error)
         else:
             try:
+                skus = list(skus_data.keys())
                 with pool.connection() as conn:
                     with conn.cursor(row_factory=namedtuple_row) as cur:
-                        order_n = cur.execute("""SELECT COALESCE(MAX(order_no),0)+1 FROM orders""").fetchone()
-                        cur.execute(
+                        # Validate and price every line item from the catalog
+                        products = catalog.lookup(cur, skus)
+                        missing = [sku for sku in skus if sku not in products]
+                        if missing:
+                            error = 'There is no product with the following sku: ' + ', '.join(missing) + '.'
+                            flash(error)
+                            return render_template("order/create.html")
+
+                        # The order and all of its lines are inserted by a
+                        # single statement; RI-3 is checked at commit.
+                        order_n = cur.execute(
                             """
-                            INSERT INTO orders (order_no, cust_no, date)
-                            VALUES (%(order_n)s, %(cust_no)s, %(date)s);
-                            """,
-                            {"order_n":order_n[0],"cust_no": cust_no, "date": date},
-                        )
-                        
-                        for key in skus_data.keys():
-                            cur.execute("SELECT sku FROM product WHERE sku = %s", (key,))
-                            if cur.rowcount == 0:
-                                error = 'There is no product with the following sku: ' + key + '.'
-                                conn.rollback()
-                                flash(error)
-                                return render_template("order/create.html")
-                            cur.execute(
-                                """
-                                INSERT INTO contains (order_no,SKU,qty)
-                                VALUES (%(order_n)s, %(sku)s, %(qt)s)
-                                """,
-                                {"order_n":order_n[0],"sku":key,"qt":skus_data[key]},
+                            WITH new_order AS (
+                                INSERT INTO orders (cust_no, date)
+                                VALUES (%(cust_no)s, %(date)s)
+                                RETURNING order_no
                             )
+                            INSERT INTO contains (order_no, SKU, qty)
+                            SELECT new_order.order_no, item.sku, item.qty
+                            FROM new_order,
+                                unnest(%(skus)s::varchar[], %(qts)s::integer[]) AS item(sku, qty)
+                            RETURNING order_no;
+                            """,
+                            {
+                                "cust_no": cust_no,
+                                "date": date,
+                                "skus": skus,
+                                "qts": [skus_data[sku] for sku in skus],
+                            },
+                            prepare=PREPARE,
+                        ).fetchone()
+                        total = sum(products[sku].price * skus_data[sku] for sku in skus)
+                        log.debug(f"Created order {order_n.order_no} with {len(skus)} products.")
                     conn.commit()
+                cache.invalidate("orders")
+                flash(f"Order {order_n.order_no} created: {len(skus)} products, {total:.2f} in total.")
                 return redirect(url_for("order_index"))
             except psycopg.DatabaseError as error:
                 error_message = str(error)
@@ -724,6 +930,117 @@ def order_create():
 
     return render_template("order/create.html")
 
+CACHE_TAGS = {"customer": "clients", "product": "products", "supplier": "suppliers"}
+
+@app.route("/import/<entity>", methods=("POST",))
+def import_entity(entity):
+    """Bulk-load customers, products or suppliers from a CSV or NDJSON upload.
+
+    The file is either a multipart ``file`` field or the raw request body;
+    the reply is a JSON report with the outcome of every rejected row.
+    """
+    from bulk_import import IMPORTERS, run_import
+
+    if entity not in IMPORTERS:
+        return jsonify({"status": "error", "message": f"Cannot import '{entity}'."}), 404
+
+    upload = request.files.get("file")
+    filename = upload.filename if upload else ""
+    fmt = request.args.get("format")
+    if not fmt:
+        is_ndjson = filename.endswith((".ndjson", ".jsonl")) or "ndjson" in (request.mimetype or "")
+        fmt = "ndjson" if is_ndjson else "csv"
+    stream = io.TextIOWrapper(upload.stream if upload else request.stream, encoding="utf-8", newline="")
+
+    try:
+        with pool.connection() as conn:
+            report = run_import(conn, entity, stream, fmt)
+        cache.invalidate(CACHE_TAGS[entity])
+    except (UnicodeDecodeError, csv.Error) as error:
+        return jsonify({"status": "error", "message": f"Unreadable upload: {error}"}), 400
+    except psycopg.DatabaseError as error:
+        log.warning(f"Import of {entity} rows failed: {error}")
+        return jsonify({"status": "error", "message": f"Import failed, nothing was imported: {error}"}), 400
+    log.info(f"Imported {report.inserted} of {report.rows} {entity} rows.")
+    return jsonify(report.as_dict())
+
+@app.route("/export/<entity>", methods=("GET",))
+def export_entity(entity):
+    """Stream a whole table as CSV (default) or NDJSON (``?format=ndjson``)."""
+    from export import EXPORTS, stream_csv, stream_ndjson
+
+    if entity not in EXPORTS:
+        return jsonify({"status": "error", "message": f"Cannot export '{entity}'."}), 404
+
+    if request.args.get("format") == "ndjson":
+        rows, mimetype, extension = stream_ndjson(reader(), entity), "application/x-ndjson", "ndjson"
+    else:
+        rows, mimetype, extension = stream_csv(reader(), entity), "text/csv", "csv"
+    return Response(
+        stream_with_context(rows),
+        mimetype=mimetype,
+        headers={"Content-Disposition": f"attachment; filename={entity}.{extension}"},
+    )
+
+@app.route("/api/<any(clients, products, suppliers, orders):entity>", methods=("GET",))
+def api_listing(entity):
+    """A list page as JSON for API clients, with the HTML page's ``?cursor=``,
+    ``?query=`` and ``?page=``. The list pages answer the same to requests
+    that accept only JSON."""
+    # each listing's cache tag is its name
+    return cache.cached(entity)(api_response)(entity)
+
+@app.route("/clients/top", methods=("GET",))
+@cache.cached("clients", "orders")
+def client_top():
+    """Customers by paid revenue (``?n=``, order dates ``?from=`` and ``?to=``)."""
+    from analytics import top_customers
+
+    limit = max(1, min(request.args.get("n", 10, type=int), 100))
+    first = request.args.get("from", type=datetime.date.fromisoformat)
+    last = request.args.get("to", type=datetime.date.fromisoformat)
+
+    with reader().connection() as conn:
+        customers = top_customers(conn, limit, first, last)
+    if wants_json():
+        return jsonify({
+            "from": first and first.isoformat(),
+            "to": last and last.isoformat(),
+            "customers": customers,
+        })
+    return render_template("client/top.html", customers=customers, first=first, last=last, limit=limit)
+
+@app.route("/analytics/sales", methods=("GET",))
+def analytics_sales():
+    """Sales breakdown and average daily sales of a year (``?year=``, ``?sku=``)."""
+    from analytics import sales_report
+
+    year = request.args.get("year", type=int)
+    if year is None:
+        return jsonify({"status": "error", "message": "Year is required!"}), 400
+    skus = request.args.getlist("sku")
+
+    with reader().connection() as conn:
+        report = sales_report(conn, year, skus)
+    return jsonify(report)
+
+@app.route("/pool/stats", methods=("GET",))
+def pool_stats():
+    """Connection pool counters, for sizing the pool against the workers."""
+    stats = {"settings": {k: v for k, v in pool_settings().items() if k != "kwargs"}, **pool.get_stats()}
+    if read_pool is not pool:
+        stats["replicas"] = read_pool.get_stats()
+    return jsonify(stats)
+
+def all_pools():
+    """Every pool of the app by name, for /metrics."""
+    return {"default": pool, **(read_pool.replicas if read_pool is not pool else {})}
+
+@app.route("/metrics", methods=("GET",))
+def metrics():
+    """Request, pool and cache metrics in the Prometheus text format."""
+    return Response(render_metrics(all_pools(), cache), content_type=METRICS_CONTENT_TYPE)
+
 @app.route("/ping", methods=("GET",))
 def ping():
     log.debug("ping!")
@@ -0,0 +1,63 @@
+#!/usr/bin/python3
+"""Throughput of the sync gunicorn app against the asyncio app.
+
+Runs one gunicorn worker of the Flask app (``--threads`` threads, one
+connection each) and then one hypercorn worker of ``aio:application`` (one
+event loop, ``--pool-size`` connections), and drives the list and search
+pages of each at every concurrency level. The page cache is disabled so both
+measure the database path.
+
+Usage: python bench/async_load.py [--concurrency 16,64,256] [--duration 10]
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+import loadgen
+from workers import APP_DIR, wait_ready
+
+
+PATHS = ("/clients", "/products", "/orders", "/clients?query=a", "/orders?query=1")
+
+
+def servers(args, port):
+    bind = f"127.0.0.1:{port}"
+    yield "sync (gunicorn)", (
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "--workers", "1",
+         "--access-logfile", "/dev/null", "wsgi:app"],
+        {"GUNICORN_BIND": bind, "GUNICORN_THREADS": str(args.threads)},
+    )
+    yield "async (hypercorn)", (
+        [sys.executable, "-m", "hypercorn", "--bind", bind, "--workers", "1", "aio:application"],
+        {"DB_POOL_MIN_SIZE": "1", "DB_POOL_MAX_SIZE": str(args.pool_size)},
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--concurrency", default="16,64,256")
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--pool-size", type=int, default=16)
+    parser.add_argument("--port", type=int, default=8767)
+    args = parser.parse_args()
+
+    base = f"http://127.0.0.1:{args.port}"
+    print(loadgen.header())
+    for label, (command, extra_env) in servers(args, args.port):
+        server = subprocess.Popen(command, cwd=APP_DIR, env={**os.environ, "CACHE_TTL": "0", **extra_env})
+        try:
+            wait_ready(base)
+            for concurrency in [int(n) for n in args.concurrency.split(",")]:
+                result = loadgen.run(
+                    lambda i: loadgen.request(base + PATHS[i % len(PATHS)]), concurrency, args.duration
+                )
+                print(loadgen.line(f"{label} c={concurrency}", result))
+        finally:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+#!/usr/bin/python3
+"""Customer and product delete time before and after migrations 0005 and
+0006.
+
+Replays the statements of ``client_delete`` and ``product_delete`` for a
+sample of customers and products that have orders. "before" first reverts,
+inside the same transaction, to the notebook's schema: the 0005 indexes are
+dropped and 0000 restores the IN (SELECT ...) trigger functions. The timing
+includes the deferred RI checks (``SET CONSTRAINTS ALL IMMEDIATE``). Every
+trial is rolled back, so the database is left untouched, but the reverts
+lock the tables: do not run it against a live database.
+
+Usage: python bench/deletes.py [DATABASE_URL] [--samples N]
+"""
+import argparse
+import os
+import re
+import statistics
+import sys
+import time
+
+import psycopg
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from migrate import MIGRATIONS_DIR  # noqa: E402
+
+
+BASELINE = os.path.join(MIGRATIONS_DIR, "0000_baseline.sql")
+INDEXES = os.path.join(MIGRATIONS_DIR, "0005_hot_query_indexes.sql")
+
+CLIENT_DELETE = (
+    "DELETE FROM contains WHERE order_no IN (SELECT order_no FROM orders WHERE cust_no = %(key)s);",
+    "DELETE FROM process pr WHERE order_no IN (SELECT order_no FROM orders WHERE cust_no = %(key)s);",
+    "DELETE FROM pay p WHERE p.cust_no = %(key)s;",
+    "DELETE FROM orders o WHERE o.cust_no = %(key)s;",
+    "DELETE FROM customer c WHERE c.cust_no = %(key)s;",
+)
+
+PRODUCT_DELETE = (
+    """
+    WITH doomed AS (
+        SELECT order_no FROM contains WHERE sku = %(key)s
+    ), deleted_contains AS (
+        DELETE FROM contains WHERE order_no IN (SELECT order_no FROM doomed)
+    ), deleted_pay AS (
+        DELETE FROM pay WHERE order_no IN (SELECT order_no FROM doomed)
+    ), deleted_process AS (
+        DELETE FROM process WHERE order_no IN (SELECT order_no FROM doomed)
+    )
+    DELETE FROM orders WHERE order_no IN (SELECT order_no FROM doomed);
+    """,
+    "DELETE FROM delivery WHERE tin IN (SELECT tin FROM supplier WHERE sku = %(key)s);",
+    "DELETE FROM supplier WHERE sku = %(key)s;",
+    "DELETE FROM product WHERE sku = %(key)s;",
+)
+
+
+def revert(conn):
+    # only the trigger functions: the rest of 0000 creates what already exists
+    with open(BASELINE) as f:
+        for function in re.findall(r"^CREATE OR REPLACE FUNCTION .*?^\$\$ LANGUAGE plpgsql;", f.read(), re.M | re.S):
+            conn.execute(function)
+    with open(INDEXES) as f:
+        for name in re.findall(r"IF NOT EXISTS (\w+)", f.read()):
+            conn.execute(f"DROP INDEX IF EXISTS {name};")
+
+
+def timed(conn, statements, keys, before):
+    samples = []
+    for key in keys:
+        if before:
+            revert(conn)
+        start = time.perf_counter()
+        for sql in statements:
+            conn.execute(sql, {"key": key})
+        conn.execute("SET CONSTRAINTS ALL IMMEDIATE;")
+        samples.append((time.perf_counter() - start) * 1000)
+        conn.rollback()
+    return statistics.median(samples), max(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("url", nargs="?", default=os.environ.get("DATABASE_URL", "postgres://p3:p3@postgres/p3"))
+    parser.add_argument("--samples", type=int, default=10)
+    args = parser.parse_args()
+
+    with psycopg.connect(args.url) as conn:
+        customers = [row[0] for row in conn.execute(
+            "SELECT cust_no FROM orders GROUP BY cust_no ORDER BY random() LIMIT %s;", (args.samples,)
+        )]
+        products = [row[0] for row in conn.execute(
+            "SELECT sku FROM contains GROUP BY sku ORDER BY random() LIMIT %s;", (args.samples,)
+        )]
+        conn.rollback()
+
+        print(f"{'handler':<16} {'schema':<8} {'median ms':>10} {'max ms':>10}")
+        for name, statements, keys in (("client_delete", CLIENT_DELETE, customers),
+                                       ("product_delete", PRODUCT_DELETE, products)):
+            results = {}
+            for label, before in (("before", True), ("after", False)):
+                results[label] = timed(conn, statements, keys, before)
+                median, worst = results[label]
+                print(f"{name:<16} {label:<8} {median:>10.2f} {worst:>10.2f}")
+            print(f"{name:<16} speedup: {results['before'][0] / results['after'][0]:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+#!/usr/bin/python3
+"""Serialization cost of a JSON page: Python objects vs. JSON built by Postgres.
+
+Compares, per page of ``--rows`` orders:
+
+- ``jsonify``: namedtuple rows copied into dicts with ``is_paid`` added, then
+  encoded (the JSON path before ``api.py``);
+- ``dict_row``: dict rows from the driver encoded with ``json.dumps``;
+- ``postgres``: one JSON text per row, joined into the body (``api.py``).
+
+Without a database URL the rows are synthetic, which times only the Python
+side. With one, every variant runs its real query, so the driver's row
+construction and Postgres' JSON building are included.
+
+Usage: python bench/json_api.py [DATABASE_URL] [--rows 1000] [--repeat N]
+"""
+import argparse
+import datetime
+import json
+import os
+import statistics
+import sys
+import time
+from collections import namedtuple
+
+from flask import Flask, jsonify
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from api import LISTINGS, _body  # noqa: E402
+
+
+Order = namedtuple("Order", "order_no cust_no date payment_order_no")
+
+NAMEDTUPLE_SQL = """
+SELECT o.order_no, o.cust_no, o.date, p.order_no AS payment_order_no
+FROM orders o LEFT JOIN pay p ON o.order_no = p.order_no
+ORDER BY o.order_no LIMIT %s
+"""
+DICT_SQL = """
+SELECT o.order_no, o.cust_no, o.date, p.order_no IS NOT NULL AS is_paid
+FROM orders o LEFT JOIN pay p ON o.order_no = p.order_no
+ORDER BY o.order_no LIMIT %s
+"""
+POSTGRES_SQL = f"""
+SELECT {LISTINGS["orders"][1]}::text
+FROM {LISTINGS["orders"][2]}
+ORDER BY o.order_no LIMIT %s
+"""
+
+
+def synthetic(n):
+    day = datetime.date(2022, 1, 1)
+    tuples = [Order(i, i % 97, day, i if i % 3 else None) for i in range(1, n + 1)]
+    dicts = [{"order_no": r.order_no, "cust_no": r.cust_no, "date": r.date, "is_paid": r.payment_order_no is not None}
+             for r in tuples]
+    texts = [(json.dumps(d, default=str),) for d in dicts]
+    return {"jsonify": lambda: tuples, "dict_row": lambda: dicts, "postgres": lambda: texts}
+
+
+def from_database(conn, n):
+    from psycopg.rows import dict_row, namedtuple_row, tuple_row
+
+    def fetch(sql, row_factory):
+        return lambda: conn.cursor(row_factory=row_factory).execute(sql, (n,)).fetchall()
+
+    return {
+        "jsonify": fetch(NAMEDTUPLE_SQL, namedtuple_row),
+        "dict_row": fetch(DICT_SQL, dict_row),
+        "postgres": fetch(POSTGRES_SQL, tuple_row),
+    }
+
+
+def encoders(flask_app):
+    def with_jsonify(rows):
+        items = [{**row._asdict(), "is_paid": row.payment_order_no is not None} for row in rows]
+        with flask_app.app_context():
+            return jsonify({"items": items, "page_number": 1}).get_data()
+
+    return {
+        "jsonify": with_jsonify,
+        "dict_row": lambda rows: json.dumps({"items": rows, "page_number": 1}, default=str).encode(),
+        "postgres": lambda rows: _body(rows, page_number=1),
+    }
+
+
+def timed(fetch, encode, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        body = encode(fetch())
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples), len(body)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("url", nargs="?", default=os.environ.get("DATABASE_URL"))
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    encode = encoders(Flask(__name__))
+    if args.url:
+        import psycopg
+
+        conn = psycopg.connect(args.url)
+        fetches = from_database(conn, args.rows)
+    else:
+        conn = None
+        fetches = synthetic(args.rows)
+
+    results = {name: timed(fetches[name], encode[name], args.repeat) for name in encode}
+    if conn is not None:
+        conn.close()
+
+    print(f"{'path':<10} {'median ms':>10} {'bytes':>9}")
+    for name, (ms, size) in results.items():
+        print(f"{name:<10} {ms:>10.3f} {size:>9}")
+    print(f"postgres vs jsonify: {results['jsonify'][0] / results['postgres'][0]:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""Minimal concurrent HTTP load generator shared by the benchmarks.
+
+Threads issue requests back to back for a fixed duration; latencies are
+collected per request and summarised as throughput and percentiles.
+"""
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import namedtuple
+
+
+Result = namedtuple("Result", "requests errors seconds rps p50 p95 p99 max")
+
+
+def percentile(samples, q):
+    if not samples:
+        return 0.0
+    if len(samples) == 1:
+        return samples[0]
+    return statistics.quantiles(samples, n=100, method="inclusive")[q - 1]
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+_no_redirect = urllib.request.build_opener(_NoRedirect)
+
+
+def request(url, method="GET", data=None, headers=None, timeout=30, follow_redirects=True):
+    """Issue one request and return its status. With ``follow_redirects``
+    false a redirect is the response, so a form POST is timed on its own."""
+    req = urllib.request.Request(url, data=data, method=method, headers=headers or {})
+    opener = urllib.request.urlopen if follow_redirects else _no_redirect.open
+    try:
+        with opener(req, timeout=timeout) as response:
+            response.read()
+            return response.status
+    except urllib.error.HTTPError as error:
+        if follow_redirects or error.code >= 400:
+            raise
+        return error.code
+
+
+def run(make_request, concurrency=8, duration=10.0):
+    """Call ``make_request(worker_index)`` from ``concurrency`` threads for
+    ``duration`` seconds. A call that raises counts as an error."""
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def worker(index):
+        local, failed = [], 0
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                make_request(index)
+            except (urllib.error.URLError, OSError, ValueError):
+                failed += 1
+                continue
+            local.append((time.perf_counter() - start) * 1000)
+        with lock:
+            latencies.extend(local)
+            errors[0] += failed
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return Result(
+        len(latencies),
+        errors[0],
+        elapsed,
+        len(latencies) / elapsed,
+        percentile(latencies, 50),
+        percentile(latencies, 95),
+        percentile(latencies, 99),
+        latencies[-1] if latencies else 0.0,
+    )
+
+
+def header():
+    return f"{'':<28} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}"
+
+
+def line(label, result):
+    return (
+        f"{label:<28} {result.rps:>9.1f} {result.p50:>8.2f} {result.p95:>8.2f}"
+        f" {result.p99:>8.2f} {result.errors:>7}"
+    )
@@ -0,0 +1,83 @@
+#!/usr/bin/python3
+"""Latency of order creation vs. number of line items, before and after
+batching.
+
+"per-item" replays the old handler: one SELECT and one INSERT per SKU.
+"batched" is the current handler: one SKU lookup with = ANY(...) and one
+INSERT ... SELECT FROM unnest(...) for the order and all of its lines.
+Every trial is rolled back, so the database is left untouched.
+
+Usage: python bench/order_create.py [DATABASE_URL] [--repeat N]
+"""
+import argparse
+import os
+import statistics
+import time
+
+import psycopg
+
+
+SIZES = (1, 10, 50, 200, 1000)
+
+
+def per_item(cur, cust_no, skus):
+    order_no = cur.execute(
+        "INSERT INTO orders (cust_no, date) VALUES (%s, CURRENT_DATE) RETURNING order_no;",
+        (cust_no,),
+    ).fetchone()[0]
+    for sku in skus:
+        cur.execute("SELECT sku FROM product WHERE sku = %s", (sku,))
+        cur.execute(
+            "INSERT INTO contains (order_no, SKU, qty) VALUES (%s, %s, %s)",
+            (order_no, sku, 1),
+        )
+
+
+def batched(cur, cust_no, skus):
+    cur.execute("SELECT sku FROM product WHERE sku = ANY(%s);", (skus,)).fetchall()
+    cur.execute(
+        """
+        WITH new_order AS (
+            INSERT INTO orders (cust_no, date) VALUES (%s, CURRENT_DATE) RETURNING order_no
+        )
+        INSERT INTO contains (order_no, SKU, qty)
+        SELECT new_order.order_no, item.sku, item.qty
+        FROM new_order, unnest(%s::varchar[], %s::integer[]) AS item(sku, qty);
+        """,
+        (cust_no, skus, [1] * len(skus)),
+    )
+
+
+def timed(conn, fn, cust_no, skus, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        with conn.cursor() as cur:
+            fn(cur, cust_no, skus)
+        samples.append((time.perf_counter() - start) * 1000)
+        conn.rollback()
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("url", nargs="?", default=os.environ.get("DATABASE_URL", "postgres://p3:p3@postgres/p3"))
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with psycopg.connect(args.url) as conn:
+        cust_no = conn.execute("SELECT cust_no FROM customer LIMIT 1;").fetchone()[0]
+        skus = [row[0] for row in conn.execute("SELECT sku FROM product LIMIT %s;", (max(SIZES),))]
+        conn.rollback()
+
+        print(f"{'lines':>6} {'per-item ms':>12} {'batched ms':>11} {'speedup':>8}")
+        for size in SIZES:
+            if size > len(skus):
+                break
+            before = timed(conn, per_item, cust_no, skus[:size], args.repeat)
+            after = timed(conn, batched, cust_no, skus[:size], args.repeat)
+            print(f"{size:>6} {before:>12.2f} {after:>11.2f} {before / after:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+#!/usr/bin/python3
+"""Throwaway Postgres servers and the project database for the benchmarks.
+
+``LocalPostgres`` runs ``initdb``/``pg_ctl`` from ``PG_BIN`` (or ``PATH``) in
+a temporary directory; it cannot run as root. ``LocalReplica`` clones a
+running ``LocalPostgres`` with ``pg_basebackup`` and follows it by streaming
+replication. ``DockerPostgres`` starts the official image instead. All of
+them stop and discard everything on exit.
+
+``load_database`` builds the schema the way the project did: the schema,
+integrity constraints and view cells of ``Entrega3.ipynb``, ``populate.sql``
+scaled by a factor, then the app's migrations. With ``data="datagen"`` the
+rows come from ``datagen.py`` instead, loaded after the migrations.
+"""
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import psycopg
+
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ROOT_DIR = os.path.dirname(APP_DIR)
+NOTEBOOK = os.path.join(ROOT_DIR, "Entrega3.ipynb")
+POPULATE = os.path.join(ROOT_DIR, "populate.sql")
+
+POPULATE_ROWS = 50000  # rows per table hard-coded in populate.sql
+POPULATE_CONTAINS = "2000*4"  # candidate order lines in populate.sql
+
+sys.path.insert(0, APP_DIR)
+from datagen import generate  # noqa: E402
+from migrate import migrate  # noqa: E402
+
+
+def wait_connectable(conninfo, timeout=60):
+    deadline = time.time() + timeout
+    while True:
+        try:
+            psycopg.connect(conninfo, connect_timeout=2).close()
+            return
+        except psycopg.OperationalError:
+            if time.time() > deadline:
+                raise
+            time.sleep(0.5)
+
+
+class LocalPostgres:
+    def __init__(self, port=55432, bindir=None):
+        self.port = port
+        self.bindir = bindir or os.environ.get("PG_BIN") or os.path.dirname(shutil.which("initdb") or "")
+        self.tmp = None
+
+    def _bin(self, name):
+        return os.path.join(self.bindir, name) if self.bindir else name
+
+    @property
+    def url(self):
+        return f"postgres://p3@127.0.0.1:{self.port}/p3"
+
+    def __enter__(self):
+        self.tmp = tempfile.mkdtemp(prefix="bench-pg-")
+        data = os.path.join(self.tmp, "data")
+        subprocess.run([self._bin("initdb"), "-D", data, "-U", "p3", "--auth=trust", "-E", "UTF8"],
+                       check=True, stdout=subprocess.DEVNULL)
+        subprocess.run(
+            [self._bin("pg_ctl"), "-D", data, "-l", os.path.join(self.tmp, "postgres.log"), "-w",
+             "-o", f"-p {self.port} -k {self.tmp} -c listen_addresses=127.0.0.1", "start"],
+            check=True, stdout=subprocess.DEVNULL,
+        )
+        with psycopg.connect(f"postgres://p3@127.0.0.1:{self.port}/postgres", autocommit=True) as conn:
+            conn.execute("CREATE DATABASE p3;")
+        return self
+
+    def stop(self):
+        subprocess.run([self._bin("pg_ctl"), "-D", os.path.join(self.tmp, "data"), "-m", "fast", "stop"],
+                       stdout=subprocess.DEVNULL)
+
+    def __exit__(self, *exc):
+        self.stop()
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+
+class LocalReplica(LocalPostgres):
+    """Hot standby of ``primary``, a running ``LocalPostgres``."""
+
+    def __init__(self, primary, port=55433):
+        super().__init__(port, primary.bindir)
+        self.primary = primary
+
+    def __enter__(self):
+        self.tmp = tempfile.mkdtemp(prefix="bench-pg-replica-")
+        data = os.path.join(self.tmp, "data")
+        subprocess.run(
+            [self._bin("pg_basebackup"), "-D", data, "-R", "-X", "stream",
+             "-h", "127.0.0.1", "-p", str(self.primary.port), "-U", "p3"],
+            check=True,
+        )
+        subprocess.run(
+            [self._bin("pg_ctl"), "-D", data, "-l", os.path.join(self.tmp, "postgres.log"), "-w",
+             "-o", f"-p {self.port} -k {self.tmp} -c listen_addresses=127.0.0.1", "start"],
+            check=True, stdout=subprocess.DEVNULL,
+        )
+        wait_connectable(self.url)
+        return self
+
+
+class DockerPostgres:
+    def __init__(self, port=55432, image="postgres:16"):
+        self.port = port
+        self.image = image
+        self.container = None
+
+    @property
+    def url(self):
+        return f"postgres://p3:p3@127.0.0.1:{self.port}/p3"
+
+    def __enter__(self):
+        self.container = subprocess.run(
+            ["docker", "run", "--rm", "-d", "-p", f"127.0.0.1:{self.port}:5432",
+             "-e", "POSTGRES_USER=p3", "-e", "POSTGRES_PASSWORD=p3", "-e", "POSTGRES_DB=p3", self.image],
+            check=True, capture_output=True, text=True,
+        ).stdout.strip()
+        wait_connectable(self.url)
+        return self
+
+    def __exit__(self, *exc):
+        subprocess.run(["docker", "stop", self.container], stdout=subprocess.DEVNULL)
+
+
+def notebook_sql():
+    """Schema, integrity constraint and view cells of the project notebook."""
+    with open(NOTEBOOK) as f:
+        cells = json.load(f)["cells"]
+    schema, constraints, view = None, [], None
+    for cell in cells:
+        source = "".join(cell["source"]).strip()
+        if cell["cell_type"] != "code" or not source.startswith("%%sql"):
+            continue
+        sql = source[len("%%sql"):]
+        if "CREATE TABLE customer" in sql:
+            schema = sql
+        elif "CONSTRAINT" in sql and ("TRIGGER" in sql or "ALTER TABLE" in sql):
+            constraints.append(sql)
+        elif "CREATE VIEW product_sales" in sql:
+            view = sql
+    return schema, constraints, view
+
+
+def scaled_populate(scale):
+    """``populate.sql`` with its row counts multiplied by ``scale``."""
+    with open(POPULATE) as f:
+        sql = f.read()
+    rows = max(1000, int(POPULATE_ROWS * scale))
+    sql = sql.replace(POPULATE_CONTAINS, str(rows * 8000 // POPULATE_ROWS))
+    sql = re.sub(rf"\b{POPULATE_ROWS}\b", str(rows), sql)
+    return sql + "\nDROP TABLE gs;\n"
+
+
+def load_database(conninfo, scale=1.0, data="populate"):
+    """Recreate the project database at ``scale`` times populate.sql's size,
+    with ``data`` from ``"populate"`` (populate.sql) or ``"datagen"``.
+
+    Everything in the ``public`` schema is dropped first.
+    """
+    schema, constraints, view = notebook_sql()
+    with psycopg.connect(conninfo) as conn:
+        conn.execute("DROP SCHEMA public CASCADE; CREATE SCHEMA public;")
+        conn.execute(schema)
+        if data == "populate":
+            conn.execute(scaled_populate(scale))
+        # The constraints are created after the data, as in the notebook:
+        # populate.sql does not satisfy the deferred RI triggers on its own.
+        for sql in constraints:
+            conn.execute(sql)
+        conn.execute(view)
+    migrate(conninfo)
+    if data == "datagen":
+        generate(conninfo, scale, log=lambda message: None)
+    with psycopg.connect(conninfo, autocommit=True) as conn:
+        conn.execute("VACUUM ANALYZE;")
@@ -0,0 +1,123 @@
+#!/usr/bin/python3
+"""Read/write splitting against a primary and a streaming replica.
+
+Starts two local Postgres servers (see ``pgserver``), loads the primary at
+``--scale`` and clones it into a hot standby, then runs the app under
+gunicorn with ``DATABASE_REPLICA_URLS`` pointing at the standby and checks:
+
+* list pages are served by the replica (its transaction count grows);
+* a client that creates a customer finds it on the next page it loads
+  (read-your-writes after POST);
+* with the replica stopped, the pages are still served, from the primary,
+  and ``/pool/stats`` reports the replica down.
+
+It then drives the list pages with and without the replica configured.
+
+Usage: python bench/replicas.py [--scale 0.1] [--concurrency 32] [--duration 10]
+"""
+import argparse
+import http.cookiejar
+import json
+import os
+import subprocess
+import sys
+import time
+import urllib.parse
+import urllib.request
+
+import psycopg
+
+import loadgen
+import pgserver
+from workers import APP_DIR, PATHS, wait_ready
+
+
+def transactions(conninfo):
+    with psycopg.connect(conninfo, autocommit=True) as conn:
+        return conn.execute("SELECT xact_commit FROM pg_stat_database WHERE datname = 'p3';").fetchone()[0]
+
+
+def start_app(port, primary, replicas=(), workers=2):
+    env = {**os.environ, "DATABASE_URL": primary, "DATABASE_REPLICA_URLS": ",".join(replicas),
+           "CACHE_TTL": "0", "SLOW_QUERY_MS": "-1", "DB_REPLICA_CHECK": "1",
+           "GUNICORN_BIND": f"127.0.0.1:{port}"}
+    app = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "--workers", str(workers),
+         "--access-logfile", "/dev/null", "wsgi:app"],
+        cwd=APP_DIR, env=env,
+    )
+    wait_ready(f"http://127.0.0.1:{port}")
+    return app
+
+
+def check(name, ok):
+    print(f"{'PASS' if ok else 'FAIL'}  {name}", flush=True)
+    return ok
+
+
+def checks(base, replica):
+    results = []
+
+    before = transactions(replica.url)
+    for _ in range(50):
+        loadgen.request(base + "/clients")
+    results.append(check("list pages read from the replica", transactions(replica.url) - before >= 50))
+
+    browser = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+    name = f"Replica Check {int(time.time())}"
+    form = {"name": name, "email": f"replica{int(time.time())}@example.com", "phone": "912345678",
+            "addressS": "Rua 1", "addressZ": "1000-100", "addressC": "Lisboa"}
+    browser.open(base + "/clients/create_client", urllib.parse.urlencode(form).encode()).read()
+    page = browser.open(base + "/clients?" + urllib.parse.urlencode({"query": name})).read().decode()
+    results.append(check("a client reads its own write", name in page))
+
+    replica.stop()
+    time.sleep(3)  # a few health checks
+    statuses = [loadgen.request(base + path) for path in PATHS]
+    results.append(check("pages served with the replica down", statuses == [200] * len(PATHS)))
+    with urllib.request.urlopen(base + "/pool/stats") as response:
+        stats = json.load(response)
+    results.append(check("replica reported down", not stats["replicas"]["replica1"]["healthy"]))
+    return all(results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scale", type=float, default=0.1)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--port", type=int, default=8769)
+    args = parser.parse_args()
+
+    base = f"http://127.0.0.1:{args.port}"
+    with pgserver.LocalPostgres() as primary:
+        pgserver.load_database(primary.url, args.scale)
+
+        def make_request(i):
+            loadgen.request(base + PATHS[i % len(PATHS)])
+
+        print(loadgen.header())
+        for label, replicas in (("primary only", 0), ("primary + replica", 1)):
+            with pgserver.LocalReplica(primary) as replica:
+                urls = [replica.url] * replicas
+                app = start_app(args.port, primary.url, urls, args.workers)
+                try:
+                    result = loadgen.run(make_request, args.concurrency, args.duration)
+                    print(loadgen.line(label, result), flush=True)
+                finally:
+                    app.terminate()
+                    app.wait()
+
+        with pgserver.LocalReplica(primary) as replica:
+            app = start_app(args.port, primary.url, [replica.url], args.workers)
+            try:
+                ok = checks(base, replica)
+            finally:
+                app.terminate()
+                app.wait()
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
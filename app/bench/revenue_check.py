@@ -0,0 +1,96 @@
+#!/usr/bin/python3
+"""Check the /clients/top sums against a fresh aggregation.
+
+Deletes, one at a time, products and customers that have paid orders, with
+the statements of ``product_delete`` and ``client_delete`` (the product
+cascade removes lines, payments and orders in a single statement), and
+after each delete compares ``customer_revenue`` and
+``customer_revenue_daily`` with SUMs over pay, orders and order_totals.
+Every delete is rolled back, so the database is left untouched. Exits with
+status 1 on the first mismatch.
+
+Usage: python bench/revenue_check.py [DATABASE_URL] [--samples N]
+"""
+import argparse
+import os
+import sys
+
+import psycopg
+
+from deletes import CLIENT_DELETE, PRODUCT_DELETE
+
+
+FRESH_DAILY = """
+SELECT o.date, p.cust_no, COUNT(*) AS orders, COALESCE(SUM(t.total), 0) AS revenue
+FROM pay p
+    JOIN orders o ON o.order_no = p.order_no
+    LEFT JOIN order_totals t ON t.order_no = p.order_no
+GROUP BY o.date, p.cust_no
+"""
+
+FRESH = f"SELECT cust_no, SUM(orders) AS orders, SUM(revenue) AS revenue FROM ({FRESH_DAILY}) AS d GROUP BY cust_no"
+
+# rows on one side only, in either direction
+MISMATCHES = """
+SELECT 'stored' AS side, * FROM (SELECT {columns} FROM {table} EXCEPT {fresh}) AS a
+UNION ALL
+SELECT 'fresh', * FROM ({fresh} EXCEPT SELECT {columns} FROM {table}) AS b
+LIMIT 10;
+"""
+
+PAID_PRODUCTS = """
+SELECT DISTINCT c.sku FROM contains c JOIN pay p ON p.order_no = c.order_no LIMIT %s;
+"""
+PAYING_CUSTOMERS = "SELECT DISTINCT cust_no FROM pay LIMIT %s;"
+
+
+def mismatches(conn):
+    found = []
+    for table, columns, fresh in (
+        ("customer_revenue", "cust_no, orders, revenue", FRESH),
+        ("customer_revenue_daily", "date, cust_no, orders, revenue", FRESH_DAILY),
+    ):
+        rows = conn.execute(MISMATCHES.format(table=table, columns=columns, fresh=fresh)).fetchall()
+        found.extend((table, *row) for row in rows)
+    return found
+
+
+def check(conn, name, statements, key):
+    try:
+        for sql in statements:
+            conn.execute(sql, {"key": key})
+        conn.execute("SET CONSTRAINTS ALL IMMEDIATE;")
+        rows = mismatches(conn)
+    finally:
+        conn.rollback()
+    if rows:
+        print(f"{name} {key}: leaderboard differs from a fresh SUM")
+        for row in rows:
+            print("   ", row)
+        return False
+    print(f"{name} {key}: ok")
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("url", nargs="?", default=os.environ.get("DATABASE_URL", "postgres://p3:p3@postgres/p3"))
+    parser.add_argument("--samples", type=int, default=5)
+    args = parser.parse_args()
+
+    with psycopg.connect(args.url) as conn:
+        if not check(conn, "before deletes", (), None):
+            sys.exit(1)
+        skus = [row[0] for row in conn.execute(PAID_PRODUCTS, (args.samples,))]
+        customers = [row[0] for row in conn.execute(PAYING_CUSTOMERS, (args.samples,))]
+        conn.rollback()
+        for sku in skus:
+            if not check(conn, "product_delete", PRODUCT_DELETE, sku):
+                sys.exit(1)
+        for cust_no in customers:
+            if not check(conn, "client_delete", CLIENT_DELETE, cust_no):
+                sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
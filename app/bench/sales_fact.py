@@ -0,0 +1,69 @@
+#!/usr/bin/python3
+"""OLAP query time on the original product_sales view vs. sales_fact.
+
+Runs the per-product GROUPING SETS breakdown from section 5 of the notebook
+against the view definition from Entrega3.ipynb (recreated as a temporary
+view) and against the sales_fact table kept up to date by migration 0003.
+
+Usage: python bench/sales_fact.py [DATABASE_URL] [--year 2022] [--repeat N]
+"""
+import argparse
+import os
+import statistics
+import time
+
+import psycopg
+
+
+ORIGINAL_VIEW = r"""
+CREATE TEMP VIEW product_sales_original AS
+SELECT sku, order_no, qty, SUM(qty*price) AS total_price, EXTRACT(YEAR FROM date) AS year,
+    TO_CHAR(date,'Month') as month, EXTRACT(DAY FROM date) AS day_of_month,
+    TO_CHAR(date,'Day') as day_of_week, SUBSTRING(address, '[0-9]{4}-[0-9]{3}\s+(.*)$') AS city
+FROM contains
+    JOIN orders USING (order_no)
+    JOIN product USING (sku)
+    JOIN customer USING (cust_no)
+GROUP BY (sku,order_no,date,address)
+ORDER BY (qty) DESC;
+"""
+
+OLAP = """
+SELECT sku, city, month, day_of_month, day_of_week,
+    SUM(qty) AS total_qty, SUM(total_price) AS total_value
+FROM {source}
+WHERE year = %s
+GROUP BY GROUPING SETS ((sku), (sku, city), (sku, month), (sku, day_of_month), (sku, day_of_week));
+"""
+
+
+def timed(conn, source, year, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        rows = conn.execute(OLAP.format(source=source), (year,)).fetchall()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples), len(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("url", nargs="?", default=os.environ.get("DATABASE_URL", "postgres://p3:p3@postgres/p3"))
+    parser.add_argument("--year", type=int, default=2022)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with psycopg.connect(args.url) as conn:
+        conn.execute(ORIGINAL_VIEW)
+        view_ms, view_rows = timed(conn, "product_sales_original", args.year, args.repeat)
+        fact_ms, fact_rows = timed(conn, "sales_fact", args.year, args.repeat)
+        conn.rollback()
+
+    print(f"{'source':<24} {'median ms':>10} {'rows':>8}")
+    print(f"{'view (original)':<24} {view_ms:>10.2f} {view_rows:>8}")
+    print(f"{'sales_fact':<24} {fact_ms:>10.2f} {fact_rows:>8}")
+    print(f"speedup: {view_ms / fact_ms:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+#!/usr/bin/python3
+"""Per-request cost of CGI against a persistent process.
+
+Runs ``app.cgi`` once per request, as the web server would, both with the
+single direct connection it now uses and with the connection pool it used
+to start, then serves the same path from one persistent gunicorn worker.
+Prints the median and 95th percentile wall time of a request in each mode.
+
+Usage: python bench/startup.py [--path /clients] [--requests 50]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+import loadgen
+from workers import APP_DIR, wait_ready
+
+
+def cgi_request(path, direct):
+    env = {
+        **os.environ,
+        "CACHE_TTL": "0",
+        "DB_DIRECT_CONNECTION": "1" if direct else "0",
+        "GATEWAY_INTERFACE": "CGI/1.1",
+        "REQUEST_METHOD": "GET",
+        "SCRIPT_NAME": "/app.cgi",
+        "PATH_INFO": path,
+        "QUERY_STRING": "",
+        "SERVER_NAME": "localhost",
+        "SERVER_PORT": "80",
+        "SERVER_PROTOCOL": "HTTP/1.1",
+    }
+    subprocess.run([sys.executable, "app.cgi"], cwd=APP_DIR, env=env, check=True,
+                   stdout=subprocess.DEVNULL)
+
+
+def timed(fn, count):
+    samples = []
+    for _ in range(count):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return statistics.median(samples), samples[int(0.95 * (len(samples) - 1))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--path", default="/clients")
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--port", type=int, default=8766)
+    args = parser.parse_args()
+
+    print(f"{'mode':<32}{'p50 ms':>10}{'p95 ms':>10}")
+    for label, direct in (("cgi, connection pool", False), ("cgi, direct connection", True)):
+        p50, p95 = timed(lambda: cgi_request(args.path, direct), args.requests)
+        print(f"{label:<32}{p50:>10.1f}{p95:>10.1f}")
+
+    base = f"http://127.0.0.1:{args.port}"
+    env = {**os.environ, "CACHE_TTL": "0", "GUNICORN_BIND": f"127.0.0.1:{args.port}"}
+    server = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "--workers", "1",
+         "--access-logfile", "/dev/null", "wsgi:app"],
+        cwd=APP_DIR, env=env,
+    )
+    try:
+        wait_ready(base)
+        p50, p95 = timed(lambda: loadgen.request(base + args.path), args.requests)
+        print(f"{'persistent (gunicorn)':<32}{p50:>10.1f}{p95:>10.1f}")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+#!/usr/bin/python3
+"""HTTP benchmark suite over every handler family.
+
+For each scale factor: brings up a throwaway Postgres (``--postgres local``
+or ``docker``; or reuses ``--database-url``), loads the notebook schema and
+``populate.sql`` (or ``datagen.py`` with ``--data datagen``) scaled by the
+factor, starts the app under gunicorn with
+the page cache off and drives each scenario with concurrent clients:
+
+* list pages, on the first page and on a page near the end of the table
+* searches on every list page
+* ``order_create`` with 1, 10 and 50 lines, and ``order_pay``
+* the customer, product and supplier delete cascades
+
+Throughput and p50/p95/p99 latency are printed per scenario. ``--output``
+saves them as JSON; ``--baseline`` compares with a saved run and marks
+scenarios whose p95 grew by more than ``--threshold``.
+
+Usage: python bench/suite.py [--scale 0.1,1] [--postgres local|docker]
+                             [--database-url URL] [--output run.json]
+                             [--baseline old.json] [--data populate|datagen]
+"""
+import argparse
+import datetime
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import urllib.parse
+from contextlib import nullcontext
+
+import psycopg
+
+import loadgen
+import pgserver
+from workers import APP_DIR, wait_ready
+
+from pagination import encode_cursor  # importable once pgserver set the path
+
+
+FORM = {"Content-Type": "application/x-www-form-urlencoded"}
+
+
+class Feed:
+    """Hands out distinct items to concurrent clients; raises when empty."""
+
+    def __init__(self, items):
+        self._items = iter(items)
+        self._lock = threading.Lock()
+
+    def next(self):
+        with self._lock:
+            item = next(self._items, None)
+        if item is None:
+            raise ValueError("fixture exhausted")
+        return item
+
+
+def deep_cursor(cur, select, keys, fraction=0.9):
+    """Cursor of the page ``fraction`` of the way through a listing."""
+    total = cur.execute(f"SELECT COUNT(*) FROM ({select}) AS t;").fetchone()[0]
+    offset = int(total * fraction)
+    columns = ", ".join(keys)
+    key = cur.execute(f"{select} ORDER BY {columns} OFFSET %s LIMIT 1;", (offset,)).fetchone()
+    return encode_cursor(list(key), offset // 5 + 1, "next") if key else None
+
+
+def fixtures(conninfo, limit):
+    with psycopg.connect(conninfo) as conn, conn.cursor() as cur:
+        def column(sql):
+            return [row[0] for row in cur.execute(sql, (limit,))]
+
+        return {
+            "cursors": {
+                "clients": deep_cursor(cur, "SELECT cust_no FROM customer", ["cust_no"]),
+                "products": deep_cursor(cur, "SELECT name, sku FROM product", ["name", "sku"]),
+                "supplier": deep_cursor(cur, "SELECT tin FROM supplier", ["tin"]),
+                "orders": deep_cursor(cur, "SELECT order_no FROM orders", ["order_no"]),
+            },
+            "customers": column("SELECT cust_no FROM customer ORDER BY random() LIMIT %s;"),
+            "skus": column("SELECT sku FROM product ORDER BY random() LIMIT %s;"),
+            "unpaid": cur.execute(
+                """
+                SELECT o.order_no, o.cust_no FROM orders o
+                WHERE NOT EXISTS (SELECT 1 FROM pay p WHERE p.order_no = o.order_no)
+                ORDER BY random() LIMIT %s;
+                """,
+                (limit,),
+            ).fetchall(),
+            "suppliers": column("SELECT tin FROM supplier ORDER BY random() LIMIT %s;"),
+        }
+
+
+def scenarios(base, data):
+    """``(name, make_request)`` pairs; the delete scenarios come last since
+    they remove the rows the others read."""
+    def get(path):
+        return lambda i: loadgen.request(base + path)
+
+    def post(request_of):
+        def make_request(i):
+            path, form = request_of()
+            loadgen.request(base + path, method="POST", data=urllib.parse.urlencode(form or {}).encode(),
+                            headers=FORM, follow_redirects=False)
+        return make_request
+
+    today = datetime.date.today().isoformat()
+
+    def create_order(lines):
+        def request_of():
+            skus = random.sample(data["skus"], lines)
+            return "/order/create_order", {
+                "cust_no": random.choice(data["customers"]),
+                "date": today,
+                "selected_products": json.dumps({sku: random.randint(1, 5) for sku in skus}),
+            }
+        return request_of
+
+    unpaid = Feed(data["unpaid"])
+    # customers and products to delete are taken from the far end of the
+    # shuffled fixtures, away from those the order scenarios use
+    doomed_customers = Feed(reversed(data["customers"]))
+    doomed_products = Feed(reversed(data["skus"]))
+    doomed_suppliers = Feed(data["suppliers"])
+
+    def pay_order():
+        order_no, cust_no = unpaid.next()
+        return f"/orders/{order_no}/pay", {"cust_no": cust_no}
+
+    result = []
+    for page in ("clients", "products", "supplier", "orders"):
+        result.append((f"list {page} first", get(f"/{page}")))
+        cursor = data["cursors"][page]
+        if cursor:
+            result.append((f"list {page} deep", get(f"/{page}?cursor={cursor}")))
+    for page, query in (("clients", "Customer 12"), ("products", "Product 7"),
+                        ("supplier", "Supplier 3"), ("orders", "2022-05")):
+        result.append((f"search {page}", get(f"/{page}?" + urllib.parse.urlencode({"query": query}))))
+    for lines in (1, 10, 50):
+        result.append((f"order_create {lines} lines", post(create_order(lines))))
+    result.append(("order_pay", post(pay_order)))
+    result.append(("delete customer", post(lambda: (f"/accounts/{doomed_customers.next()}/delete", None))))
+    result.append(("delete product", post(lambda: (f"/product/{doomed_products.next()}/delete", None))))
+    result.append(("delete supplier", post(lambda: (f"/supplier/{doomed_suppliers.next()}/delete", None))))
+    return result
+
+
+def compare(name, result, baseline, threshold):
+    old = baseline.get(name)
+    if not old or not old["p95"] or not old["rps"]:
+        return ""
+    change = result.p95 / old["p95"] - 1
+    text = f"  p95 {change:+.0%} rps {result.rps / old['rps'] - 1:+.0%}"
+    return text + ("  REGRESSION" if change > threshold else "")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scale", default="1")
+    parser.add_argument("--postgres", choices=("local", "docker"), default="local")
+    parser.add_argument("--database-url", help="use this database instead; it is dropped and reloaded")
+    parser.add_argument("--data", choices=("populate", "datagen"), default="populate")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--port", type=int, default=8768)
+    parser.add_argument("--output")
+    parser.add_argument("--baseline")
+    parser.add_argument("--threshold", type=float, default=0.10)
+    args = parser.parse_args()
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    if args.database_url:
+        server = nullcontext(argparse.Namespace(url=args.database_url))
+    elif args.postgres == "docker":
+        server = pgserver.DockerPostgres()
+    else:
+        server = pgserver.LocalPostgres()
+
+    base = f"http://127.0.0.1:{args.port}"
+    results = {}
+    with server as postgres:
+        for scale in [float(s) for s in args.scale.split(",")]:
+            print(f"\nscale {scale:g}: loading...", flush=True)
+            pgserver.load_database(postgres.url, scale, args.data)
+            data = fixtures(postgres.url, limit=20000)
+
+            env = {**os.environ, "DATABASE_URL": postgres.url, "CACHE_TTL": "0", "SLOW_QUERY_MS": "-1",
+                   "GUNICORN_BIND": f"127.0.0.1:{args.port}", "GUNICORN_THREADS": str(args.threads)}
+            app = subprocess.Popen(
+                [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "--workers", str(args.workers),
+                 "--access-logfile", "/dev/null", "wsgi:app"],
+                cwd=APP_DIR, env=env,
+            )
+            try:
+                wait_ready(base)
+                print(loadgen.header())
+                for name, make_request in scenarios(base, data):
+                    result = loadgen.run(make_request, args.concurrency, args.duration)
+                    key = f"{scale:g}/{name}"
+                    results[key] = result._asdict()
+                    print(loadgen.line(name, result) + compare(key, result, baseline, args.threshold), flush=True)
+            finally:
+                app.terminate()
+                app.wait()
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
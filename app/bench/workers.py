@@ -0,0 +1,70 @@
+#!/usr/bin/python3
+"""Throughput of the gunicorn deployment per worker count.
+
+Starts ``gunicorn -c gunicorn.conf.py wsgi:app`` once per worker count,
+drives the list pages with a fixed number of concurrent clients and prints
+requests per second and latency percentiles for each.
+
+Usage: python bench/workers.py [--workers 1,2,4,8] [--concurrency 32] [--duration 10]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+import urllib.error
+
+import loadgen
+
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PATHS = ("/clients", "/products", "/supplier", "/orders")
+
+
+def wait_ready(base, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            loadgen.request(base + "/ping", timeout=1)
+            return
+        except (urllib.error.URLError, OSError):
+            time.sleep(0.2)
+    raise RuntimeError("gunicorn did not start")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", default="1,2,4,8")
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    base = f"http://127.0.0.1:{args.port}"
+    # caching would measure the cache, not the workers
+    env = {**os.environ, "CACHE_TTL": "0", "GUNICORN_BIND": f"127.0.0.1:{args.port}",
+           "GUNICORN_THREADS": str(args.threads)}
+
+    print(loadgen.header())
+    for count in [int(n) for n in args.workers.split(",")]:
+        server = subprocess.Popen(
+            [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "--workers", str(count),
+             "--access-logfile", "/dev/null", "wsgi:app"],
+            cwd=APP_DIR, env=env,
+        )
+        try:
+            wait_ready(base)
+            result = loadgen.run(
+                lambda i: loadgen.request(base + PATHS[i % len(PATHS)]),
+                args.concurrency,
+                args.duration,
+            )
+            print(loadgen.line(f"{count} worker(s) x {args.threads} threads", result))
+        finally:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+#!/usr/bin/python3
+"""Bulk import of customers, products and suppliers from CSV or NDJSON.
+
+The upload is read one record at a time: each record is checked with the same
+rules as the form handlers (``validation.py``) and valid ones are streamed
+with ``COPY FROM STDIN`` into a temporary staging table. The staging table is
+then merged into the real table in a single statement, skipping records that
+clash with existing rows. Nothing but the error report is kept in memory, so
+file size is bounded by the database, not by the web worker.
+
+Usage: python bulk_import.py {customer,product,supplier} FILE [--format ndjson] [--url URL]
+"""
+import argparse
+import csv
+import io
+import json
+import os
+from collections import namedtuple
+
+import psycopg
+
+from validation import CUSTOMER_FIELDS
+from validation import PRODUCT_FIELDS
+from validation import SUPPLIER_FIELDS
+from validation import clean_customer
+from validation import clean_product
+from validation import clean_supplier
+
+
+MAX_REPORTED_ERRORS = 1000
+
+Importer = namedtuple("Importer", "fields clean columns rejects insert key conflict")
+
+
+def duplicates(column):
+    """Remove staged rows repeating an earlier row's ``column``."""
+    return f"""
+        DELETE FROM import_staging a USING import_staging b
+        WHERE a.{column} = b.{column} AND a.line > b.line
+        RETURNING a.line, a.{column}
+        """
+
+
+# Each ``rejects`` statement removes offending rows from the staging table,
+# returning their line and value; what is left is inserted by ``insert``,
+# skipping rows that clash with existing data (reported with ``conflict``).
+IMPORTERS = {
+    "customer": Importer(
+        CUSTOMER_FIELDS,
+        clean_customer,
+        "name VARCHAR(80), email VARCHAR(254), phone VARCHAR(15), address VARCHAR(255)",
+        [(duplicates("email"), "Email '{}' appears earlier in the file!")],
+        """
+        INSERT INTO customer (name, email, phone, address)
+        SELECT name, email, phone, address FROM import_staging ORDER BY line
+        ON CONFLICT DO NOTHING
+        RETURNING email
+        """,
+        "email",
+        "Email '{email}' is already in use!",
+    ),
+    "product": Importer(
+        PRODUCT_FIELDS,
+        clean_product,
+        "sku VARCHAR(25), name VARCHAR(200), description VARCHAR, price NUMERIC(10, 2), ean NUMERIC(13)",
+        [
+            (duplicates("sku"), "SKU '{}' appears earlier in the file!"),
+            (duplicates("ean"), "EAN '{}' appears earlier in the file!"),
+        ],
+        """
+        INSERT INTO product (sku, name, description, price, ean)
+        SELECT sku, name, description, price, ean FROM import_staging ORDER BY line
+        ON CONFLICT DO NOTHING
+        RETURNING sku
+        """,
+        "sku",
+        "SKU '{sku}' or EAN '{ean}' is already used!",
+    ),
+    "supplier": Importer(
+        SUPPLIER_FIELDS,
+        clean_supplier,
+        "tin VARCHAR(20), name VARCHAR(200), address VARCHAR(255), sku VARCHAR(25), date DATE",
+        [
+            (duplicates("tin"), "Tin '{}' appears earlier in the file!"),
+            (
+                """
+                DELETE FROM import_staging s
+                WHERE s.sku IS NOT NULL
+                    AND NOT EXISTS (SELECT 1 FROM product p WHERE p.sku = s.sku)
+                RETURNING s.line, s.sku
+                """,
+                "SKU '{}' does not exist!",
+            ),
+        ],
+        """
+        INSERT INTO supplier (tin, name, address, sku, date)
+        SELECT tin, name, address, sku, date FROM import_staging ORDER BY line
+        ON CONFLICT DO NOTHING
+        RETURNING tin
+        """,
+        "tin",
+        "Tin '{tin}' already exists!",
+    ),
+}
+
+
+class Report:
+    """Per-row outcome of an import; only the first errors are kept."""
+
+    def __init__(self, entity):
+        self.entity = entity
+        self.rows = 0
+        self.inserted = 0
+        self.error_count = 0
+        self.errors = []
+
+    def error(self, line, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line, "error": message})
+
+    def as_dict(self):
+        return {
+            "entity": self.entity,
+            "rows": self.rows,
+            "inserted": self.inserted,
+            "error_count": self.error_count,
+            "errors": sorted(self.errors, key=lambda e: e["line"]),
+        }
+
+
+def read_records(stream, fmt):
+    """Yield ``(line, record)`` from a text stream, one record at a time."""
+    if fmt == "ndjson":
+        for line, text in enumerate(stream, start=1):
+            if text.strip():
+                try:
+                    record = json.loads(text)
+                except ValueError:
+                    record = None
+                yield line, record if isinstance(record, dict) else None
+    else:
+        reader = csv.DictReader(stream)
+        for record in reader:
+            yield reader.line_num, record
+
+
+def run_import(conn, entity, stream, fmt="csv"):
+    """Validate, stage and merge the records read from ``stream``."""
+    importer = IMPORTERS[entity]
+    report = Report(entity)
+    with conn.cursor() as cur:
+        cur.execute(
+            f"CREATE TEMP TABLE import_staging (line INTEGER, {importer.columns}) ON COMMIT DROP;"
+        )
+        columns = ", ".join(("line",) + importer.fields)
+        with cur.copy(f"COPY import_staging ({columns}) FROM STDIN") as copy:
+            for line, record in read_records(stream, fmt):
+                report.rows += 1
+                if record is None:
+                    report.error(line, "Malformed record!")
+                    continue
+                raw = [record.get(field) for field in importer.fields]
+                raw = ["" if value is None else str(value).strip() for value in raw]
+                values, error = importer.clean(*raw)
+                if error is not None:
+                    report.error(line, error)
+                    continue
+                copy.write_row([line] + [values[field] for field in importer.fields])
+
+        for statement, message in importer.rejects:
+            for line, value in cur.execute(statement):
+                report.error(line, message.format(value))
+
+        fields = ", ".join(f"s.{field}" for field in importer.fields)
+        key = importer.key
+        rejected = cur.execute(
+            f"""
+            WITH inserted AS ({importer.insert})
+            SELECT s.line, {fields} FROM import_staging s
+            WHERE NOT EXISTS (SELECT 1 FROM inserted i WHERE i.{key} = s.{key});
+            """
+        )
+        for row in rejected:
+            # optional fields (a product's EAN) are shown empty when missing
+            values = {field: "" if value is None else value for field, value in zip(importer.fields, row[1:])}
+            report.error(row[0], importer.conflict.format(**values))
+        report.inserted = report.rows - report.error_count
+    conn.commit()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("entity", choices=sorted(IMPORTERS))
+    parser.add_argument("file")
+    parser.add_argument("--format", choices=("csv", "ndjson"))
+    parser.add_argument("--url", default=os.environ.get("DATABASE_URL", "postgres://p3:p3@postgres/p3"))
+    args = parser.parse_args()
+
+    fmt = args.format or ("ndjson" if args.file.endswith((".ndjson", ".jsonl")) else "csv")
+    with psycopg.connect(args.url) as conn:
+        with io.open(args.file, newline="", encoding="utf-8") as stream:
+            report = run_import(conn, args.entity, stream, fmt)
+    print(json.dumps(report.as_dict(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+"""Response cache for the read-mostly pages.
+
+GET responses are cached under their path, query string and representation
+(HTML or JSON) together with the current *generation* of every tag they
+depend on (``"clients"``, ``"orders"``, ...). A write bumps the generations of
+the tags it affects, so every page built from older data stops matching at
+once, without the cache having to find and delete those entries.
+
+Backends, chosen by ``CACHE_URL``:
+
+* ``memory://`` (default): in-process LRU with TTL. Each worker has its own,
+  so a write would only invalidate the worker that served it: with more than
+  one worker (``CACHE_WORKERS``, or ``gunicorn.conf.py``) it is refused unless
+  caching is off.
+* ``redis://host:port/db``: shared between workers and hosts. Needs the
+  optional ``redis`` package. The only backend that works with several
+  workers.
+* ``local://``: the in-process LRU again, with values pickled as for
+  ``redis://``, to measure the serialisation cost without a server. It is not
+  shared and is refused with several workers like ``memory://``.
+"""
+import functools
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from flask import g
+from flask import make_response
+from flask import request
+from flask import session
+
+try:
+    import redis
+except ImportError:  # optional dependency, only needed for redis://
+    redis = None
+
+
+class LRUCache:
+    """Thread-safe in-process cache with a size bound and per-entry TTL."""
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._counters = {}  # never evicted, unlike cached values
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires is not None and expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def counter(self, key):
+        with self._lock:
+            return self._counters.get(key, 0)
+
+    def incr(self, key):
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+            return self._counters[key]
+
+
+class PickledLRUCache(LRUCache):
+    """Per-process ``LRUCache`` that stores values pickled, as ``RedisCache``
+    does; only for measuring that cost, invalidation stays per process."""
+
+    def get(self, key):
+        value = super().get(key)
+        return pickle.loads(value) if value is not None else None
+
+    def set(self, key, value, ttl=None):
+        super().set(key, pickle.dumps(value), ttl)
+
+
+class RedisCache:
+    def __init__(self, url):
+        if redis is None:
+            raise RuntimeError("CACHE_URL uses redis:// but the redis package is not installed")
+        self._client = redis.Redis.from_url(url)
+
+    def get(self, key):
+        value = self._client.get(key)
+        return pickle.loads(value) if value is not None else None
+
+    def set(self, key, value, ttl=None):
+        self._client.set(key, pickle.dumps(value), px=max(1, int(ttl * 1000)) if ttl else None)
+
+    def counter(self, key):
+        return int(self._client.get(key) or 0)
+
+    def incr(self, key):
+        return self._client.incr(key)
+
+
+def make_backend(url, maxsize=1024):
+    if url.startswith("redis://"):
+        return RedisCache(url)
+    if url.startswith("local://"):
+        return PickledLRUCache(maxsize)
+    return LRUCache(maxsize)
+
+
+class ResponseCache:
+    def __init__(self, backend, ttl=60):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()  # gthread workers count from several threads
+
+    @classmethod
+    def from_env(cls):
+        url = os.environ.get("CACHE_URL", "memory://")
+        ttl = float(os.environ.get("CACHE_TTL", "60"))
+        cache = cls(make_backend(url, int(os.environ.get("CACHE_SIZE", "1024"))), ttl)
+        cache.check_workers(int(os.environ.get("CACHE_WORKERS", "1")))
+        return cache
+
+    @property
+    def shared(self):
+        """Whether every process sees the same entries and generations."""
+        return isinstance(self.backend, RedisCache)
+
+    def check_workers(self, workers):
+        """Refuse to cache in a per-process backend that ``workers`` processes
+        would each keep, where writes only invalidate their own."""
+        if workers > 1 and self.ttl > 0 and not self.shared:
+            raise RuntimeError(
+                f"The page cache would be kept separately in each of the {workers} workers, where writes "
+                "would only invalidate their own: use CACHE_URL=redis://... or set CACHE_TTL=0"
+            )
+
+    def _key(self, tags):
+        generations = ",".join(str(self.backend.counter(f"gen:{tag}")) for tag in tags)
+        accept = request.accept_mimetypes
+        variant = "json" if accept["application/json"] and not accept["text/html"] else "html"
+        return f"page:{request.full_path}|{variant}|{generations}"
+
+    def cached(self, *tags):
+        """Cache a GET view's successful responses under ``tags``."""
+
+        def decorator(view):
+            @functools.wraps(view)
+            def wrapper(*args, **kwargs):
+                # pages rendered with flashed messages are one-offs; views may
+                # also opt a request out by setting g.bypass_cache, or only
+                # keep their response from being stored with g.no_store
+                if self.ttl <= 0 or request.method != "GET" or session.get("_flashes") or g.get("bypass_cache"):
+                    return view(*args, **kwargs)
+
+                key = self._key(tags)
+                hit = self.backend.get(key)
+                if hit is not None:
+                    with self._lock:
+                        self.hits += 1
+                    body, status, content_type = hit
+                    response = make_response(body, status)
+                    response.content_type = content_type
+                    return response
+
+                with self._lock:
+                    self.misses += 1
+                response = make_response(view(*args, **kwargs))
+                if response.status_code == 200 and not response.is_streamed and not g.get("no_store"):
+                    self.backend.set(
+                        key, (response.get_data(), response.status_code, response.content_type), self.ttl
+                    )
+                return response
+
+            return wrapper
+
+        return decorator
+
+    def invalidate(self, *tags):
+        """Retire every cached page that depends on any of ``tags``."""
+        for tag in tags:
+            self.backend.incr(f"gen:{tag}")
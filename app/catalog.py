@@ -0,0 +1,186 @@
+"""Process-local copy of the product catalog: SKU -> name, price and EAN.
+
+``order_create`` validates and prices its lines here and the order form's
+SKU autocomplete (``/products/complete``) is answered from here, so neither
+queries ``product``. The copy is loaded by a background thread, which then
+listens on ``product_changed``: the triggers of migration 0007 notify
+the SKUs every committed write touched, and the thread re-reads just those
+rows (or everything, after bulk changes). Writes are seen here a moment
+after they commit, in every process.
+
+Until the first load completes, and while the listening connection is down,
+every lookup goes to the database instead. A SKU missing from the copy is
+also looked up there before it is reported as unknown, since it may have
+been created since the last notification; a price changed in that window
+can be read stale, but only to display it.
+
+``PRODUCT_CATALOG=0`` turns the copy off (lookups always query), which suits
+one-shot processes such as ``app.cgi``.
+"""
+import bisect
+import json
+import logging
+import os
+import select
+import threading
+from collections import namedtuple
+
+import psycopg
+
+from db import DATABASE_URL, PREPARE
+
+
+CHANNEL = "product_changed"
+
+Product = namedtuple("Product", "sku name price ean")
+
+SELECT = "SELECT sku, name, price, ean FROM product"
+
+log = logging.getLogger(__name__)
+
+
+def _like(prefix):
+    return prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+
+
+class ProductCatalog:
+    """Products of ``conninfo`` kept in memory by a listener thread.
+
+    ``on_change`` is called from that thread, with no arguments, after every
+    change it applies.
+    """
+
+    def __init__(self, conninfo=DATABASE_URL, enabled=True, poll=1.0, retry=5.0, on_change=None):
+        self.conninfo = conninfo
+        self.enabled = enabled
+        self.poll = poll
+        self.retry = retry
+        self.on_change = on_change
+        self.ready = False
+        self.products = {}
+        self._skus = []  # sorted (casefolded sku, sku)
+        self._names = []  # sorted (casefolded name, sku)
+        self._pending = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._listener = None
+
+    @property
+    def closed(self):
+        return self.enabled and self._listener is None
+
+    def open(self):
+        if self.closed:
+            self._stop.clear()
+            self._listener = threading.Thread(target=self._listen_forever, name="product-catalog", daemon=True)
+            self._listener.start()
+
+    def close(self):
+        self._stop.set()
+        self._listener = None
+        self.ready = False
+
+    # Lookups
+
+    def lookup(self, cur, skus):
+        """``{sku: Product}`` for those of ``skus`` that exist."""
+        found = {}
+        if self.ready:
+            for sku in skus:
+                product = self.products.get(sku)
+                if product is not None:
+                    found[sku] = product
+        missing = [sku for sku in skus if sku not in found]
+        if missing:
+            rows = cur.execute(SELECT + " WHERE sku = ANY(%s);", (missing,), prepare=PREPARE).fetchall()
+            found.update((row[0], Product(*row)) for row in rows)
+        return found
+
+    def complete(self, pool, prefix, limit=10):
+        """Up to ``limit`` products whose SKU, then whose name, starts with
+        ``prefix`` (ignoring case). ``pool`` is only used when not ready."""
+        if not self.ready:
+            with pool.connection() as conn:
+                rows = conn.execute(
+                    SELECT + " WHERE sku ILIKE %(p)s OR name ILIKE %(p)s ORDER BY sku LIMIT %(limit)s;",
+                    {"p": _like(prefix), "limit": limit},
+                    prepare=PREPARE,
+                ).fetchall()
+            return [Product(*row) for row in rows]
+        key = prefix.casefold()
+        skus = []
+        with self._lock:
+            for index in (self._skus, self._names):
+                i = bisect.bisect_left(index, (key,))
+                while i < len(index) and len(skus) < limit and index[i][0].startswith(key):
+                    if index[i][1] not in skus:
+                        skus.append(index[i][1])
+                    i += 1
+        return [self.products[sku] for sku in skus if sku in self.products]
+
+    # Keeping the copy current
+
+    def _load(self, conn):
+        products = {row[0]: Product(*row) for row in conn.execute(SELECT + ";")}
+        with self._lock:
+            self.products = products
+            self._skus = sorted((sku.casefold(), sku) for sku in products)
+            self._names = sorted((p.name.casefold(), sku) for sku, p in products.items())
+        log.info(f"Loaded {len(products)} products.")
+
+    def _unindex(self, index, key, sku):
+        i = bisect.bisect_left(index, (key, sku))
+        if i < len(index) and index[i] == (key, sku):
+            del index[i]
+
+    def _refresh(self, conn, skus):
+        rows = {row[0]: Product(*row) for row in conn.execute(SELECT + " WHERE sku = ANY(%s);", (skus,))}
+        with self._lock:
+            for sku in skus:
+                old = self.products.pop(sku, None)
+                if old is not None:
+                    self._unindex(self._skus, sku.casefold(), sku)
+                    self._unindex(self._names, old.name.casefold(), sku)
+                new = rows.get(sku)
+                if new is not None:
+                    self.products[sku] = new
+                    bisect.insort(self._skus, (sku.casefold(), sku))
+                    bisect.insort(self._names, (new.name.casefold(), sku))
+
+    def _notified(self, notify):
+        self._pending.append(notify.payload)
+
+    def _apply(self, conn):
+        payloads, self._pending = self._pending, []
+        if not payloads:
+            return
+        if "" in payloads:
+            self._load(conn)
+        else:
+            self._refresh(conn, sorted({sku for payload in payloads for sku in json.loads(payload)}))
+        if self.on_change is not None:
+            self.on_change()
+
+    def _listen_forever(self):
+        while not self._stop.is_set():
+            try:
+                with psycopg.connect(self.conninfo, autocommit=True) as conn:
+                    conn.add_notify_handler(self._notified)
+                    conn.execute(f"LISTEN {CHANNEL};")
+                    # loaded after LISTEN, so no write is missed in between
+                    self._load(conn)
+                    self.ready = True
+                    while not self._stop.is_set():
+                        if select.select([conn.fileno()], [], [], self.poll)[0]:
+                            conn.execute("SELECT 1;")  # receives the pending notifications
+                        self._apply(conn)
+            except psycopg.Error as error:
+                log.warning(f"Product catalog is down, reading from the database: {error}")
+            self.ready = False
+            self._pending = []
+            self._stop.wait(self.retry)
+
+
+def create_catalog(**overrides):
+    enabled = os.environ.get("PRODUCT_CATALOG", "1") != "0"
+    return ProductCatalog(enabled=enabled, **overrides)
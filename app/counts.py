@@ -0,0 +1,79 @@
+"""Row counts for the list and search pages, exact when small.
+
+``COUNT(*)`` reads every row it counts, so totals come from the planner's
+statistics when those say a result is large: ``pg_class.reltuples`` scaled
+to the table's current size (what the planner itself assumes) for whole
+tables, and ``EXPLAIN``'s row estimate for search predicates. Results the
+statistics put under ``COUNT_EXACT_LIMIT`` rows are counted exactly, and
+that count stops at the limit, so a stale estimate never costs a full scan.
+"""
+import math
+import os
+from collections import namedtuple
+
+
+EXACT_LIMIT = int(os.environ.get("COUNT_EXACT_LIMIT", "10000"))
+
+Count = namedtuple("Count", "value exact")
+
+# The planner's estimate of the table's current row count, or NULL when the
+# table was never analyzed.
+TABLE_ESTIMATE = """
+SELECT CASE WHEN c.reltuples < 0 OR c.relpages = 0 THEN NULL
+    ELSE c.reltuples / c.relpages * (pg_relation_size(c.oid) / current_setting('block_size')::INTEGER)
+    END
+FROM pg_class c WHERE c.oid = %s::regclass;
+"""
+
+
+def _capped(table):
+    return f"SELECT COUNT(*) FROM (SELECT 1 FROM {table} LIMIT %s) AS t;", (EXACT_LIMIT + 1,)
+
+
+def _table_count(estimate, exact=None):
+    if exact is None:
+        return Count(int(estimate), False)
+    if exact <= EXACT_LIMIT:
+        return Count(exact, True)
+    return Count(max(int(estimate or 0), exact), False)
+
+
+def _is_large(estimate):
+    return estimate is not None and estimate >= EXACT_LIMIT
+
+
+def table_count(cur, table, prepare=None):
+    """``Count`` of the rows of ``table``."""
+    estimate = cur.execute(TABLE_ESTIMATE, (table,), prepare=prepare).fetchone()[0]
+    if _is_large(estimate):
+        return _table_count(estimate)
+    sql, params = _capped(table)
+    return _table_count(estimate, cur.execute(sql, params, prepare=prepare).fetchone()[0])
+
+
+async def table_count_async(cur, table, prepare=None):
+    """``table_count`` on an ``AsyncCursor``."""
+    await cur.execute(TABLE_ESTIMATE, (table,), prepare=prepare)
+    estimate = (await cur.fetchone())[0]
+    if _is_large(estimate):
+        return _table_count(estimate)
+    sql, params = _capped(table)
+    await cur.execute(sql, params, prepare=prepare)
+    return _table_count(estimate, (await cur.fetchone())[0])
+
+
+def planner_rows(cur, sql, params=None):
+    """The planner's estimate of the rows ``sql`` returns."""
+    plan = cur.execute("EXPLAIN (FORMAT JSON) " + sql, params).fetchone()[0]
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+async def planner_rows_async(cur, sql, params=None):
+    await cur.execute("EXPLAIN (FORMAT JSON) " + sql, params)
+    plan = (await cur.fetchone())[0]
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+def page_count(total, limit):
+    """Pages needed for ``total`` rows (at least one, the empty page)."""
+    return max(1, math.ceil(total / limit))
@@ -0,0 +1,369 @@
+#!/usr/bin/python3
+"""Generate a consistent synthetic dataset for every table, at any scale.
+
+Row counts grow linearly with ``--scale`` (1 gives 50,000 customers and
+products, 100,000 orders with about 300,000 lines, and so on). Every value
+is a function of the row's number and ``--seed``, so chunks of a table are
+generated and streamed with ``COPY`` by independent worker processes, and
+references between tables need no lookups: the customer of order ``n``,
+its lines, its payment and the employee that processed it are all computed
+from ``n``. The data satisfies the schema and the integrity constraints:
+every order has lines (RI-3), workplaces are either an office or a
+warehouse (RI-2) and employees are adults (RI-1).
+
+The tables must exist and be empty (``--truncate`` empties them). User
+triggers on the loaded tables are disabled while loading, which locks them,
+and the tables the migrations maintain with triggers are rebuilt at the end.
+
+Usage: python datagen.py [--scale 1] [--workers N] [--chunk 100000] [--seed 1]
+                         [--truncate] [--url URL]
+"""
+import argparse
+import datetime
+import os
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import psycopg
+
+
+ROWS = {  # at scale 1
+    "customer": 50000,
+    "product": 50000,
+    "orders": 100000,
+    "employee": 10000,
+    "supplier": 20000,
+    "department": 100,
+    "workplace": 500,
+}
+MAX_LINES = 5  # lines per order, 1 to MAX_LINES
+PAID_PERCENT = 60
+PROCESSED_PERCENT = 50
+ORDER_DAYS = 5 * 365  # orders are spread over the last five years
+CITIES = ("Lisboa", "Porto", "Coimbra", "Braga", "Faro", "Aveiro", "Evora", "Setubal", "Viseu", "Leiria")
+COPY_BUFFER = 8192  # lines per write
+
+# Every table written, parents first; user triggers are disabled on these.
+TABLES = (
+    "department", "workplace", "office", "warehouse", "customer", "product", "employee", "works",
+    "orders", "contains", "pay", "process", "supplier", "delivery",
+)
+
+# Tables the migrations keep in step with the base tables through triggers,
+# which are off during the load; each is rebuilt with one statement.
+DERIVED = (
+    (
+        "sales_fact",  # migrations/0003_sales_fact.sql
+        """
+        INSERT INTO sales_fact
+        SELECT c.sku, c.order_no, c.qty, c.qty * p.price,
+            EXTRACT(YEAR FROM o.date), TO_CHAR(o.date, 'Month'), EXTRACT(DAY FROM o.date),
+            TO_CHAR(o.date, 'Day'), sales_fact_city(cu.address), o.date
+        FROM contains c
+            JOIN orders o ON o.order_no = c.order_no
+            JOIN product p ON p.sku = c.sku
+            JOIN customer cu ON cu.cust_no = o.cust_no;
+        """,
+    ),
+    (
+        "order_totals",  # migrations/0008_order_totals.sql
+        """
+        INSERT INTO order_totals (order_no, lines, items, total)
+        SELECT order_no, COUNT(*), COALESCE(SUM(qty), 0), COALESCE(SUM(total_price), 0)
+        FROM sales_fact
+        GROUP BY order_no;
+        """,
+    ),
+    (
+        "customer_revenue_orders",  # migrations/0009_customer_revenue.sql
+        """
+        INSERT INTO customer_revenue_orders (order_no, cust_no, date, total)
+        SELECT p.order_no, p.cust_no, o.date, COALESCE(t.total, 0)
+        FROM pay p
+            JOIN orders o ON o.order_no = p.order_no
+            LEFT JOIN order_totals t ON t.order_no = p.order_no;
+        """,
+    ),
+    (
+        "customer_revenue_daily",  # migrations/0009_customer_revenue.sql
+        """
+        INSERT INTO customer_revenue_daily (date, cust_no, orders, revenue)
+        SELECT date, cust_no, COUNT(*), SUM(total)
+        FROM customer_revenue_orders
+        GROUP BY date, cust_no;
+        """,
+    ),
+    (
+        "customer_revenue",
+        """
+        INSERT INTO customer_revenue (cust_no, orders, revenue)
+        SELECT cust_no, SUM(orders), SUM(revenue)
+        FROM customer_revenue_daily
+        GROUP BY cust_no;
+        """,
+    ),
+    (
+        "sales_cube",  # migrations/0004_sales_cube.sql
+        """
+        INSERT INTO sales_cube (date_key, sku, city, lines, qty, total_value)
+        SELECT TO_CHAR(date, 'YYYYMMDD')::INTEGER, sku, COALESCE(city, ''),
+            COUNT(*), COALESCE(SUM(qty), 0), COALESCE(SUM(total_price), 0)
+        FROM sales_fact
+        GROUP BY 1, 2, 3;
+        UPDATE sales_cube_versions SET version = version + 1 WHERE slot = 0;
+        """,
+    ),
+)
+
+Sizes = namedtuple("Sizes", sorted(ROWS))
+
+MASK = (1 << 64) - 1
+
+
+def sizes_at(scale):
+    sizes = {table: max(10, int(rows * scale)) for table, rows in ROWS.items()}
+    sizes["workplace"] += sizes["workplace"] % 2  # as many offices as warehouses
+    return Sizes(**sizes)
+
+
+def mix(n, salt, seed):
+    """Well-spread 64-bit hash of a row number (splitmix64 finaliser)."""
+    z = (n + (salt << 32) + seed * 0x9E3779B97F4A7C15) & MASK
+    z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & MASK
+    z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & MASK
+    return z ^ (z >> 31)
+
+
+def zip_city(n, seed):
+    h = mix(n, 1, seed)
+    return f"{1000 + h % 9000:04d}-{h // 9000 % 1000:03d} {CITIES[h // 9000000 % len(CITIES)]}"
+
+
+def workplace_address(i, seed):
+    return f"Rua do Trabalho {i}, {zip_city(-i, seed)}"
+
+
+def order_customer(n, sizes, seed):
+    return 1 + mix(n, 10, seed) % sizes.customer
+
+
+def order_skus(n, sizes, seed):
+    """Distinct product numbers on order ``n``."""
+    lines = 1 + mix(n, 11, seed) % MAX_LINES
+    start = mix(n, 12, seed) % sizes.product
+    gap = max(1, sizes.product // MAX_LINES)
+    return [1 + (start + k * gap) % sizes.product for k in range(lines)]
+
+
+TODAY = datetime.date.today()
+
+
+def day(offset):
+    return (TODAY - datetime.timedelta(days=offset)).isoformat()
+
+
+# Row generators: each yields COPY text lines for rows [start, stop).
+
+def customer_rows(start, stop, sizes, seed):
+    for n in range(start, stop):
+        phone = 910000000 + mix(n, 2, seed) % 90000000
+        yield f"{n}\tCustomer {n}\tcustomer{n}@example.com\t{phone}\tRua {n}, {zip_city(n, seed)}\n"
+
+
+def product_rows(start, stop, sizes, seed):
+    for n in range(start, stop):
+        price = 100 + mix(n, 3, seed) % 49900
+        yield f"SKU{n}\tProduct {n}\tDescription for Product {n}\t{price // 100}.{price % 100:02d}\t{5600000000000 + n}\n"
+
+
+def employee_rows(start, stop, sizes, seed):
+    for n in range(start, stop):
+        age_days = 19 * 365 + mix(n, 4, seed) % (45 * 365)
+        yield f"SSN{n}\tETIN{n}\t{day(age_days)}\tEmployee {n}\n"
+
+
+def works_rows(start, stop, sizes, seed):
+    for n in range(start, stop):
+        department = 1 + mix(n, 5, seed) % sizes.department
+        workplace = 1 + mix(n, 6, seed) % sizes.workplace
+        yield f"SSN{n}\tDepartment {department}\t{workplace_address(workplace, seed)}\n"
+
+
+def order_rows(start, stop, sizes, seed):
+    for n in range(start, stop):
+        yield f"{n}\t{order_customer(n, sizes, seed)}\t{day(mix(n, 13, seed) % ORDER_DAYS)}\n"
+
+
+def contains_rows(start, stop, sizes, seed):
+    for n in range(start, stop):
+        for sku in order_skus(n, sizes, seed):
+            yield f"{n}\tSKU{sku}\t{1 + mix(n * MAX_LINES + sku, 14, seed) % 10}\n"
+
+
+def pay_rows(start, stop, sizes, seed):
+    for n in range(start, stop):
+        if mix(n, 15, seed) % 100 < PAID_PERCENT:
+            yield f"{n}\t{order_customer(n, sizes, seed)}\n"
+
+
+def process_rows(start, stop, sizes, seed):
+    for n in range(start, stop):
+        if mix(n, 16, seed) % 100 < PROCESSED_PERCENT:
+            yield f"SSN{1 + mix(n, 17, seed) % sizes.employee}\t{n}\n"
+
+
+def supplier_rows(start, stop, sizes, seed):
+    for n in range(start, stop):
+        sku = 1 + mix(n, 18, seed) % sizes.product
+        yield f"TIN{n}\tSupplier {n}\tRua {n}, {zip_city(n + sizes.customer, seed)}\tSKU{sku}\t{day(mix(n, 19, seed) % 730)}\n"
+
+
+def delivery_rows(start, stop, sizes, seed):
+    warehouses = sizes.workplace // 2  # the even-numbered workplaces
+    for n in range(start, stop):
+        first = mix(n, 20, seed) % warehouses
+        count = min(warehouses, 1 + mix(n, 21, seed) % 2)
+        for k in range(count):
+            yield f"{workplace_address(2 * (1 + (first + k) % warehouses), seed)}\tTIN{n}\n"
+
+
+# table -> (columns, row generator); a chunk of the first table of a group is
+# loaded together with the same rows' children, in one transaction, so RI-3
+# holds at every commit.
+COPIES = {
+    "customer": ("cust_no, name, email, phone, address", customer_rows),
+    "product": ("sku, name, description, price, ean", product_rows),
+    "employee": ("ssn, tin, bdate, name", employee_rows),
+    "works": ("ssn, name, address", works_rows),
+    "orders": ("order_no, cust_no, date", order_rows),
+    "contains": ("order_no, sku, qty", contains_rows),
+    "pay": ("order_no, cust_no", pay_rows),
+    "process": ("ssn, order_no", process_rows),
+    "supplier": ("tin, name, address, sku, date", supplier_rows),
+    "delivery": ("address, tin", delivery_rows),
+}
+GROUPS = (
+    (("customer",), ("product",), ("employee", "works")),
+    (("orders", "contains", "pay", "process"), ("supplier", "delivery")),
+)
+
+
+def copy_rows(cur, table, lines):
+    columns = COPIES[table][0]
+    count, buffer = 0, []
+    with cur.copy(f"COPY {table} ({columns}) FROM STDIN") as copy:
+        for line in lines:
+            buffer.append(line)
+            if len(buffer) >= COPY_BUFFER:
+                copy.write("".join(buffer))
+                count += len(buffer)
+                buffer.clear()
+        copy.write("".join(buffer))
+    return count + len(buffer)
+
+
+def load_chunk(conninfo, tables, start, stop, sizes, seed):
+    """Load rows ``[start, stop)`` of ``tables[0]`` and their children."""
+    counts = {}
+    with psycopg.connect(conninfo) as conn, conn.cursor() as cur:
+        for table in tables:
+            counts[table] = copy_rows(cur, table, COPIES[table][1](start, stop, sizes, seed))
+    return counts
+
+
+def load_places(conninfo, sizes, seed):
+    """Departments and workplaces, split evenly between offices (odd
+    numbers) and warehouses (even), in one transaction for RI-2."""
+    with psycopg.connect(conninfo) as conn, conn.cursor() as cur:
+        with cur.copy("COPY department (name) FROM STDIN") as copy:
+            copy.write("".join(f"Department {n}\n" for n in range(1, sizes.department + 1)))
+        workplaces = range(1, sizes.workplace + 1)
+        with cur.copy("COPY workplace (address, lat, long) FROM STDIN") as copy:
+            for i in workplaces:
+                copy.write(f"{workplace_address(i, seed)}\t{-80 + (i % 160000) * 0.001:.6f}\t{-170 + (i // 160000) * 0.001:.6f}\n")
+        with cur.copy("COPY office (address) FROM STDIN") as copy:
+            copy.write("".join(f"{workplace_address(i, seed)}\n" for i in workplaces if i % 2))
+        with cur.copy("COPY warehouse (address) FROM STDIN") as copy:
+            copy.write("".join(f"{workplace_address(i, seed)}\n" for i in workplaces if not i % 2))
+    return {"department": sizes.department, "workplace": sizes.workplace}
+
+
+def existing(conn, tables):
+    return [t for t in tables if conn.execute("SELECT to_regclass(%s);", (t,)).fetchone()[0]]
+
+
+def set_triggers(conn, enabled):
+    derived = existing(conn, [table for table, _ in DERIVED])
+    for table in (*TABLES, *derived):
+        conn.execute(f"ALTER TABLE {table} {'ENABLE' if enabled else 'DISABLE'} TRIGGER USER;")
+    conn.commit()
+
+
+def generate(conninfo, scale=1.0, workers=None, chunk=100000, seed=1, truncate=False, log=print):
+    """Fill the database at ``scale``; returns the rows loaded per table."""
+    sizes = sizes_at(scale)
+    totals = {}
+    with psycopg.connect(conninfo) as conn:
+        if truncate:
+            conn.execute(f"TRUNCATE {', '.join((*TABLES, *existing(conn, [t for t, _ in DERIVED])))} CASCADE;")
+        set_triggers(conn, False)
+        try:
+            started = time.perf_counter()
+            totals.update(load_places(conninfo, sizes, seed))
+            with ProcessPoolExecutor(workers) as executor:
+                for groups in GROUPS:
+                    futures = []
+                    for tables in groups:
+                        size = getattr(sizes, tables[0])
+                        for start in range(1, size + 1, chunk):
+                            stop = min(start + chunk, size + 1)
+                            futures.append(executor.submit(load_chunk, conninfo, tables, start, stop, sizes, seed))
+                    for future in futures:
+                        for table, count in future.result().items():
+                            totals[table] = totals.get(table, 0) + count
+                    log(f"{', '.join(t for g in groups for t in g)} loaded in {time.perf_counter() - started:.1f}s")
+
+            for table, sql in DERIVED:
+                if existing(conn, [table]):
+                    conn.execute(f"TRUNCATE {table};")
+                    conn.execute(sql)
+                    conn.commit()
+                    log(f"{table} rebuilt in {time.perf_counter() - started:.1f}s")
+            for table, column in (("customer", "cust_no"), ("orders", "order_no")):
+                conn.execute(
+                    f"""
+                    SELECT setval(pg_get_serial_sequence('{table}', '{column}'), COALESCE(MAX({column}), 0) + 1, false)
+                    FROM {table} WHERE pg_get_serial_sequence('{table}', '{column}') IS NOT NULL;
+                    """
+                )
+            conn.commit()
+        finally:
+            conn.rollback()
+            set_triggers(conn, True)
+        conn.autocommit = True
+        conn.execute("ANALYZE;")
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scale", type=float, default=1.0)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--chunk", type=int, default=100000, help="rows per COPY transaction")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--truncate", action="store_true", help="empty the tables first")
+    parser.add_argument("--url", default=os.environ.get("DATABASE_URL", "postgres://p3:p3@postgres/p3"))
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    totals = generate(args.url, args.scale, args.workers, args.chunk, args.seed, args.truncate)
+    elapsed = time.perf_counter() - started
+    for table, count in totals.items():
+        print(f"{table:<12} {count:>14,}")
+    rows = sum(totals.values())
+    print(f"{'total':<12} {rows:>14,} rows in {elapsed:.1f}s ({rows / elapsed:,.0f} rows/s)")
+
+
+if __name__ == "__main__":
+    main()
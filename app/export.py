@@ -0,0 +1,55 @@
+"""Streaming export of whole tables as CSV or NDJSON.
+
+Rows go from Postgres to the client as they are produced: CSV is relayed
+block by block from ``COPY ... TO STDOUT`` and NDJSON is encoded from a named
+(server-side) cursor fetched in batches. Memory use does not depend on the
+size of the table and the first bytes leave before the query has finished.
+"""
+import contextlib
+import json
+
+import psycopg
+from psycopg.rows import dict_row
+
+
+BATCH_SIZE = 2000
+
+EXPORTS = {
+    "customer": "SELECT cust_no, name, email, phone, address FROM customer ORDER BY cust_no",
+    "product": "SELECT sku, name, description, price, ean FROM product ORDER BY sku",
+    "supplier": "SELECT tin, name, address, sku, date FROM supplier ORDER BY tin",
+    "orders": """
+        SELECT o.order_no, o.cust_no, o.date, p.order_no IS NOT NULL AS is_paid
+        FROM orders o LEFT JOIN pay p ON o.order_no = p.order_no
+        ORDER BY o.order_no
+        """,
+    "contains": "SELECT order_no, sku, qty FROM contains ORDER BY order_no, sku",
+}
+
+
+def stream_csv(pool, entity):
+    """Yield the CSV export of ``entity``, header first."""
+    with pool.connection() as conn:
+        with conn.cursor() as cur:
+            # a client hanging up mid-export cancels the query instead of
+            # draining the rest of the table
+            with contextlib.suppress(psycopg.errors.QueryCanceled):
+                with cur.copy(f"COPY ({EXPORTS[entity]}) TO STDOUT WITH (FORMAT csv, HEADER)") as copy:
+                    try:
+                        for block in copy:
+                            yield bytes(block)
+                    except GeneratorExit:
+                        conn.cancel()
+                        raise
+
+
+def stream_ndjson(pool, entity):
+    """Yield the NDJSON export of ``entity``, one object per line."""
+    with pool.connection() as conn:
+        with conn.cursor(name=f"export_{entity}", row_factory=dict_row) as cur:
+            cur.execute(EXPORTS[entity])
+            while True:
+                rows = cur.fetchmany(BATCH_SIZE)
+                if not rows:
+                    break
+                yield "".join(json.dumps(row, default=str) + "\n" for row in rows).encode()
@@ -0,0 +1,61 @@
+# Gunicorn settings for serving the app on every core:
+#   gunicorn -c gunicorn.conf.py wsgi:app
+#
+# The app is preloaded in the master so workers fork with the code already
+# imported, but the connection pool is only opened after the fork (post_fork)
+# and closed when the worker exits, so no connection is ever shared between
+# processes.
+import multiprocessing
+import os
+
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:" + os.environ.get("PORT", "8000"))
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
+worker_class = "gthread"
+threads = int(os.environ.get("GUNICORN_THREADS", "4"))
+preload_app = True
+timeout = 30
+graceful_timeout = 30
+keepalive = 5
+# recycle workers now and then to bound the effect of any slow leak
+max_requests = 10000
+max_requests_jitter = 1000
+accesslog = "-"
+
+# A request holds at most one connection, so a worker needs at most one per
+# thread. Set before the app is imported so db.pool_settings() sees it.
+os.environ.setdefault("DB_POOL_MIN_SIZE", "1")
+os.environ.setdefault("DB_POOL_MAX_SIZE", str(threads))
+
+
+def on_starting(server):
+    # With several workers the page cache only works with CACHE_URL=redis://:
+    # each worker would keep its own memory:// cache, and a write only
+    # invalidates the worker that served it. server.cfg.workers is the count
+    # gunicorn really starts (--workers, WEB_CONCURRENCY or this file). The
+    # app is preloaded by now, so its cache is switched off here, before the
+    # workers fork, unless CACHE_TTL asks for it, which is refused.
+    from app import cache
+
+    workers = server.cfg.workers
+    os.environ["CACHE_WORKERS"] = str(workers)
+    if workers > 1 and not cache.shared and "CACHE_TTL" not in os.environ:
+        cache.ttl = 0
+        server.log.warning(f"Page cache is off: {workers} workers need a shared CACHE_URL=redis://...")
+    cache.check_workers(workers)
+
+
+def post_fork(server, worker):
+    from app import catalog, pool, read_pool
+
+    pool.open()
+    read_pool.open()
+    catalog.open()
+
+
+def worker_exit(server, worker):
+    from app import catalog, pool, read_pool
+
+    catalog.close()
+    read_pool.close()
+    pool.close()
@@ -0,0 +1,222 @@
+"""Per-request database instrumentation.
+
+Connections are created with a timed cursor class, and pools are wrapped so
+the time spent waiting for a connection is measured too. While a request is
+being served, every statement's duration and row count and every connection
+wait are added to the request's ``Trace``; the app turns that into a
+``Server-Timing`` response header.
+
+Statements slower than ``SLOW_QUERY_MS`` are written to the ``slow_query``
+logger as one JSON object per line. With ``SLOW_QUERY_EXPLAIN=1`` the log
+line also carries the statement's plan from a plain ``EXPLAIN``, which plans
+the statement without running it again; for actual row counts and timings,
+load ``auto_explain`` on the server instead. Set ``SLOW_QUERY_MS`` to a
+negative value to turn the log off.
+"""
+import json
+import logging
+import os
+import re
+import time
+from contextlib import asynccontextmanager
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+import psycopg
+
+
+SLOW_QUERY_MS = float(os.environ.get("SLOW_QUERY_MS", "250"))
+SLOW_QUERY_EXPLAIN = os.environ.get("SLOW_QUERY_EXPLAIN", "0") == "1"
+
+slow_log = logging.getLogger("slow_query")
+
+_EXPLAINABLE = re.compile(r"^\s*(SELECT|WITH|INSERT|UPDATE|DELETE)\b", re.IGNORECASE)
+
+
+class Trace:
+    """What one request spent in the database."""
+
+    __slots__ = ("name", "started", "status", "statements", "rows", "db_time", "waits", "wait_time")
+
+    def __init__(self, name=None):
+        self.name = name
+        self.started = time.perf_counter()
+        self.status = None  # set by the app once the response exists
+        self.statements = 0
+        self.rows = 0
+        self.db_time = 0.0
+        self.waits = 0
+        self.wait_time = 0.0
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def server_timing(self):
+        """``Server-Timing`` header value; durations in milliseconds."""
+        return (
+            f'db;dur={self.db_time * 1000:.1f};desc="{self.statements} queries, {self.rows} rows", '
+            f"db-wait;dur={self.wait_time * 1000:.1f}, app;dur={self.elapsed() * 1000:.1f}"
+        )
+
+
+_trace = ContextVar("trace", default=None)
+
+
+def start_trace(name=None):
+    trace = Trace(name)
+    _trace.set(trace)
+    return trace
+
+
+def current_trace():
+    return _trace.get()
+
+
+def end_trace():
+    trace = _trace.get()
+    _trace.set(None)
+    return trace
+
+
+def _sql_text(query, conn):
+    if isinstance(query, bytes):
+        return query.decode()
+    if isinstance(query, str):
+        return query
+    return query.as_string(conn)
+
+
+def _explain_sql(sql):
+    # never ANALYZE: that would run a user's statement a second time
+    return "EXPLAIN " + sql if _EXPLAINABLE.match(sql) else None
+
+
+def _record(cursor, elapsed):
+    trace = _trace.get()
+    if trace is not None:
+        trace.statements += 1
+        trace.db_time += elapsed
+        trace.rows += max(cursor.rowcount, 0)
+
+
+def _is_slow(elapsed):
+    return SLOW_QUERY_MS >= 0 and elapsed * 1000 >= SLOW_QUERY_MS
+
+
+def _log_slow(sql, elapsed, rows, plan):
+    trace = _trace.get()
+    entry = {
+        "duration_ms": round(elapsed * 1000, 1),
+        "rows": rows,
+        "endpoint": trace.name if trace else None,
+        "statement": " ".join(sql.split()),
+    }
+    if plan is not None:
+        entry["plan"] = plan
+    slow_log.warning(json.dumps(entry))
+
+
+class TimedCursor(psycopg.Cursor):
+    """Cursor that adds every statement to the current request's trace."""
+
+    def execute(self, query, params=None, **kwargs):
+        start = time.perf_counter()
+        try:
+            super().execute(query, params, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            _record(self, elapsed)
+        if _is_slow(elapsed):
+            self._slow(query, params, elapsed)
+        return self
+
+    def executemany(self, query, params_seq, **kwargs):
+        start = time.perf_counter()
+        try:
+            return super().executemany(query, params_seq, **kwargs)
+        finally:
+            _record(self, time.perf_counter() - start)
+
+    def _slow(self, query, params, elapsed):
+        sql = _sql_text(query, self.connection)
+        plan = None
+        explain = _explain_sql(sql) if SLOW_QUERY_EXPLAIN else None
+        if explain:
+            try:
+                # a savepoint, so a failed EXPLAIN cannot abort the caller's transaction
+                with self.connection.transaction():
+                    rows = psycopg.Cursor(self.connection).execute(explain, params).fetchall()
+                plan = "\n".join(row[0] for row in rows)
+            except psycopg.Error as error:
+                plan = f"EXPLAIN failed: {error}"
+        _log_slow(sql, elapsed, self.rowcount, plan)
+
+
+class TimedAsyncCursor(psycopg.AsyncCursor):
+    """``TimedCursor`` for ``AsyncConnection``."""
+
+    async def execute(self, query, params=None, **kwargs):
+        start = time.perf_counter()
+        try:
+            await super().execute(query, params, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            _record(self, elapsed)
+        if _is_slow(elapsed):
+            await self._slow(query, params, elapsed)
+        return self
+
+    async def executemany(self, query, params_seq, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await super().executemany(query, params_seq, **kwargs)
+        finally:
+            _record(self, time.perf_counter() - start)
+
+    async def _slow(self, query, params, elapsed):
+        sql = _sql_text(query, self.connection)
+        plan = None
+        explain = _explain_sql(sql) if SLOW_QUERY_EXPLAIN else None
+        if explain:
+            try:
+                async with self.connection.transaction():
+                    cur = psycopg.AsyncCursor(self.connection)
+                    await cur.execute(explain, params)
+                    rows = await cur.fetchall()
+                plan = "\n".join(row[0] for row in rows)
+            except psycopg.Error as error:
+                plan = f"EXPLAIN failed: {error}"
+        _log_slow(sql, elapsed, self.rowcount, plan)
+
+
+def _record_wait(elapsed):
+    trace = _trace.get()
+    if trace is not None:
+        trace.waits += 1
+        trace.wait_time += elapsed
+
+
+class TracedPool:
+    """Pool wrapper adding the wait for each connection to the trace."""
+
+    def __init__(self, pool):
+        self._pool = pool
+
+    def __getattr__(self, name):
+        return getattr(self._pool, name)
+
+    @contextmanager
+    def connection(self, timeout=None):
+        start = time.perf_counter()
+        with self._pool.connection(timeout) as conn:
+            _record_wait(time.perf_counter() - start)
+            yield conn
+
+
+class TracedAsyncPool(TracedPool):
+    @asynccontextmanager
+    async def connection(self, timeout=None):
+        start = time.perf_counter()
+        async with self._pool.connection(timeout) as conn:
+            _record_wait(time.perf_counter() - start)
+            yield conn
@@ -0,0 +1,181 @@
+"""Process-local metrics in the Prometheus text exposition format.
+
+Requests update counters, gauges and histograms kept in memory, each behind
+its own lock, so recording costs a dictionary lookup and a few additions.
+Values that already exist elsewhere (pool and cache statistics) are not
+mirrored on every request; they are read when ``/metrics`` is scraped.
+
+Every process keeps its own values: under gunicorn each worker answers
+``/metrics`` for itself.
+"""
+import bisect
+import threading
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 10, 25, 50, 100)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names, values, extra=""):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        if not self.label_names and self.kind != "histogram":
+            self._values[()] = 0
+
+    def _key(self, labels):
+        return tuple(labels[name] for name in self.label_names)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+    def render(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        lines = self.header()
+        for key, value in items:
+            lines.append(f"{self.name}{_labels(self.label_names, key)} {_number(value)}")
+        return lines
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._values.get(key) or ([0] * (len(self.buckets) + 1), 0)
+            counts[index] += 1
+            self._values[key] = (counts, total + value)
+
+    def render(self):
+        with self._lock:
+            items = sorted((key, (list(counts), total)) for key, (counts, total) in self._values.items())
+        lines = self.header()
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip((*self.buckets, float("inf")), counts):
+                cumulative += count
+                labels = _labels(self.label_names, key, f'le="{_number(bound)}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _labels(self.label_names, key)
+            lines.append(f"{self.name}_sum{labels} {_number(float(total))}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+def snapshot(name, help, kind, samples, label_names=()):
+    """Lines for a metric read at scrape time: ``samples`` maps label value
+    tuples to numbers."""
+    lines = [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+    for key, value in sorted(samples.items()):
+        lines.append(f"{name}{_labels(label_names, key)} {_number(value)}")
+    return lines
+
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "Time to produce a response.", ("endpoint", "method")
+)
+REQUESTS = Counter("http_requests_total", "Responses sent.", ("endpoint", "method", "status"))
+IN_FLIGHT = Gauge("http_requests_in_flight", "Requests being served.")
+STATEMENTS = Histogram(
+    "db_statements_per_request", "Database round trips per request.", ("endpoint",), STATEMENT_BUCKETS
+)
+DB_TIME = Counter("db_statement_seconds_total", "Time spent running statements.", ("endpoint",))
+DB_WAIT = Counter("db_pool_wait_seconds_total", "Time spent waiting for a pooled connection.", ("endpoint",))
+
+REQUEST_METRICS = (REQUEST_LATENCY, REQUESTS, IN_FLIGHT, STATEMENTS, DB_TIME, DB_WAIT)
+
+# psycopg_pool statistics that are current values; every other one counts up
+# from the pool's start, so it is exported as a counter.
+POOL_GAUGES = {"pool_min", "pool_max", "pool_size", "pool_available", "requests_waiting"}
+
+
+def observe_request(endpoint, method, status, trace):
+    """Record a finished request from its ``instrument.Trace``."""
+    endpoint = endpoint or "unmatched"
+    REQUEST_LATENCY.observe(trace.elapsed(), endpoint=endpoint, method=method)
+    REQUESTS.inc(endpoint=endpoint, method=method, status=status)
+    STATEMENTS.observe(trace.statements, endpoint=endpoint)
+    if trace.db_time:
+        DB_TIME.inc(trace.db_time, endpoint=endpoint)
+    if trace.wait_time:
+        DB_WAIT.inc(trace.wait_time, endpoint=endpoint)
+
+
+def render(pools, cache=None):
+    """The whole exposition: request metrics, then the stats of every pool in
+    ``pools`` (name -> pool) and of the page ``cache``."""
+    lines = []
+    for metric in REQUEST_METRICS:
+        lines.extend(metric.render())
+
+    stats = {name: pool.get_stats() for name, pool in pools.items()}
+    for key in sorted({key for values in stats.values() for key in values}):
+        samples = {
+            (name,): values[key] for name, values in stats.items()
+            if isinstance(values.get(key), (int, float)) and not isinstance(values[key], bool)
+        }
+        if not samples:
+            continue
+        if key in POOL_GAUGES:
+            lines.extend(snapshot(f"db_pool_{key}", f"psycopg_pool statistic {key}.", "gauge", samples, ("pool",)))
+        else:
+            lines.extend(
+                snapshot(f"db_pool_{key}_total", f"psycopg_pool statistic {key}.", "counter", samples, ("pool",))
+            )
+
+    if cache is not None:
+        lines.extend(snapshot("page_cache_hits_total", "Pages served from the cache.", "counter", {(): cache.hits}))
+        lines.extend(snapshot("page_cache_misses_total", "Pages rendered and cached.", "counter", {(): cache.misses}))
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,111 @@
+#!/usr/bin/python3
+"""Apply the SQL migrations in ``migrations/`` that the database has not seen.
+
+Migrations are plain ``NNNN_description.sql`` files applied in version order
+and recorded in ``schema_migrations``. A file whose first line is
+``-- migrate: no-transaction`` runs statement by statement in autocommit mode,
+which ``CREATE INDEX CONCURRENTLY`` needs so live tables stay writable while
+the index builds.
+
+History is linear: a migration numbered below one the database already has
+is refused rather than applied out of order. ``0000`` is the notebook's
+schema; on a database that already has it (built from the notebook) it is
+recorded as applied without running.
+
+Usage: python migrate.py [DATABASE_URL]
+"""
+import os
+import re
+import sys
+
+import psycopg
+
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+NO_TRANSACTION = "-- migrate: no-transaction"
+BASELINE = "0000"
+
+
+def available():
+    """All migration files as ``(version, path)``, oldest first."""
+    migrations = []
+    for filename in sorted(os.listdir(MIGRATIONS_DIR)):
+        match = re.match(r"^(\d+)_.*\.sql$", filename)
+        if match:
+            migrations.append((match.group(1), os.path.join(MIGRATIONS_DIR, filename)))
+    return migrations
+
+
+def applied(conn):
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version VARCHAR(16) PRIMARY KEY,
+                applied_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+            );
+            """
+        )
+        versions = {row[0] for row in cur.execute("SELECT version FROM schema_migrations;")}
+        # built from the notebook, and maybe migrated before 0000 existed:
+        # the baseline's schema is already there
+        if BASELINE not in versions and cur.execute("SELECT to_regclass('customer') IS NOT NULL;").fetchone()[0]:
+            print(f"Recording {BASELINE} as applied")
+            cur.execute("INSERT INTO schema_migrations (version) VALUES (%s);", (BASELINE,))
+            versions.add(BASELINE)
+    conn.commit()
+    return versions
+
+
+def split_statements(sql):
+    """Split a script on statement-ending semicolons (one per line end)."""
+    return [stmt.strip() for stmt in re.split(r";\s*$", sql, flags=re.M) if stmt.strip()]
+
+
+def run(conn, path):
+    """Execute one migration file without recording it."""
+    with open(path) as f:
+        sql = f.read()
+    if sql.startswith(NO_TRANSACTION):
+        conn.autocommit = True
+        try:
+            for statement in split_statements(sql):
+                conn.execute(statement)
+        finally:
+            conn.autocommit = False
+    else:
+        conn.execute(sql)
+
+
+def apply(conn, version, path):
+    run(conn, path)
+    conn.execute("INSERT INTO schema_migrations (version) VALUES (%s);", (version,))
+    conn.commit()
+
+
+def migrate(conninfo):
+    """Apply every pending migration, returning the versions applied."""
+    done = []
+    with psycopg.connect(conninfo) as conn:
+        seen = applied(conn)
+        pending = [(version, path) for version, path in available() if version not in seen]
+        newest = max(seen, key=int, default=None)
+        late = [version for version, _ in pending if newest is not None and int(version) < int(newest)]
+        if late:
+            raise RuntimeError(
+                f"Migration(s) {', '.join(late)} are older than {newest}, which is already applied: "
+                "number them after it"
+            )
+        for version, path in pending:
+            print(f"Applying {os.path.basename(path)}")
+            apply(conn, version, path)
+            done.append(version)
+    return done
+
+
+if __name__ == "__main__":
+    url = sys.argv[1] if len(sys.argv) > 1 else os.environ.get(
+        "DATABASE_URL", "postgres://p3:p3@postgres/p3"
+    )
+    applied_versions = migrate(url)
+    print(f"{len(applied_versions)} migration(s) applied.")
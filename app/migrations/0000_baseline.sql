@@ -0,0 +1,204 @@
+-- The schema of Entrega3.ipynb: tables, the integrity constraints (RI-1 to
+-- RI-3) and the product_sales view, so an empty database can be built with
+-- migrate.py alone. A database created from the notebook already has all of
+-- it; migrate.py records this version there without running it.
+
+CREATE TABLE customer (
+    cust_no INTEGER PRIMARY KEY,
+    name VARCHAR(80) NOT NULL,
+    email VARCHAR(254) UNIQUE NOT NULL,
+    phone VARCHAR(15),
+    address VARCHAR(255)
+);
+
+-- RI-3: every order_no must exist in contains (insert_order_trigger)
+CREATE TABLE orders (
+    order_no INTEGER PRIMARY KEY,
+    cust_no INTEGER NOT NULL REFERENCES customer,
+    date DATE NOT NULL
+);
+
+CREATE TABLE pay (
+    order_no INTEGER PRIMARY KEY REFERENCES orders,
+    cust_no INTEGER NOT NULL REFERENCES customer
+);
+
+-- RI-1: employees are at least 18
+CREATE TABLE employee (
+    ssn VARCHAR(20) PRIMARY KEY,
+    tin VARCHAR(20) UNIQUE NOT NULL,
+    bdate DATE,
+    name VARCHAR NOT NULL,
+    CONSTRAINT check_age CHECK (
+        date_part('year', age(NOW()::date, bdate)) -
+          CASE WHEN extract(month from NOW()::date) < extract(month from bdate)
+                OR (extract(month from NOW()::date) = extract(month from bdate)
+                    AND extract(day from NOW()::date) < extract(day from bdate))
+               THEN 1
+               ELSE 0
+          END >= 18
+    )
+);
+
+CREATE TABLE process (
+    ssn VARCHAR(20) REFERENCES employee,
+    order_no INTEGER REFERENCES orders,
+    PRIMARY KEY (ssn, order_no)
+);
+
+CREATE TABLE department (
+    name VARCHAR PRIMARY KEY
+);
+
+-- RI-2: a workplace is an office or a warehouse, not both
+CREATE TABLE workplace (
+    address VARCHAR PRIMARY KEY,
+    lat NUMERIC(8, 6) NOT NULL,
+    long NUMERIC(9, 6) NOT NULL,
+    UNIQUE (lat, long)
+);
+
+CREATE TABLE office (
+    address VARCHAR(255) PRIMARY KEY REFERENCES workplace
+);
+
+CREATE TABLE warehouse (
+    address VARCHAR(255) PRIMARY KEY REFERENCES workplace
+);
+
+CREATE TABLE works (
+    ssn VARCHAR(20) REFERENCES employee,
+    name VARCHAR(200) REFERENCES department,
+    address VARCHAR(255) REFERENCES workplace,
+    PRIMARY KEY (ssn, name, address)
+);
+
+CREATE TABLE product (
+    sku VARCHAR(25) PRIMARY KEY,
+    name VARCHAR(200) NOT NULL,
+    description VARCHAR,
+    price NUMERIC(10, 2) NOT NULL,
+    ean NUMERIC(13) UNIQUE
+);
+
+CREATE TABLE contains (
+    order_no INTEGER REFERENCES orders,
+    sku VARCHAR(25) REFERENCES product,
+    qty INTEGER,
+    PRIMARY KEY (order_no, sku)
+);
+
+CREATE TABLE supplier (
+    tin VARCHAR(20) PRIMARY KEY,
+    name VARCHAR(200),
+    address VARCHAR(255),
+    sku VARCHAR(25) REFERENCES product,
+    date DATE
+);
+
+CREATE TABLE delivery (
+    address VARCHAR(255) REFERENCES warehouse,
+    tin VARCHAR(20) REFERENCES supplier,
+    PRIMARY KEY (address, tin)
+);
+
+-- RI-2, as written in the notebook (0006 rewrites the checks)
+
+CREATE OR REPLACE FUNCTION insert_warehouse_func() RETURNS TRIGGER AS
+$$
+BEGIN
+    IF NEW.address IN (SELECT address FROM office) THEN
+        RAISE EXCEPTION 'Address % is from an office.', NEW.address;
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER insert_warehouse_trigger BEFORE INSERT ON warehouse
+FOR EACH ROW EXECUTE FUNCTION insert_warehouse_func();
+
+CREATE OR REPLACE FUNCTION remove_office_warehouse_func() RETURNS TRIGGER AS
+$$
+BEGIN
+    IF OLD.address IN (SELECT address FROM workplace) THEN
+        RAISE EXCEPTION 'You need to remove the office/warehouse from workplace';
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE CONSTRAINT TRIGGER remove_office_warehouse_trigger AFTER DELETE ON office
+DEFERRABLE INITIALLY DEFERRED
+FOR EACH ROW EXECUTE FUNCTION remove_office_warehouse_func();
+
+CREATE CONSTRAINT TRIGGER remove_office_warehouse_trigger AFTER DELETE ON warehouse
+DEFERRABLE INITIALLY DEFERRED
+FOR EACH ROW EXECUTE FUNCTION remove_office_warehouse_func();
+
+CREATE OR REPLACE FUNCTION insert_office_func() RETURNS TRIGGER AS
+$$
+BEGIN
+    IF NEW.address IN (SELECT address FROM warehouse) THEN
+        RAISE EXCEPTION 'Address % is from a warehouse.', NEW.address;
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER insert_office_trigger BEFORE INSERT ON office
+FOR EACH ROW EXECUTE FUNCTION insert_office_func();
+
+CREATE OR REPLACE FUNCTION insert_workplace_func() RETURNS TRIGGER AS
+$$
+BEGIN
+    IF NEW.address NOT IN (SELECT address FROM warehouse UNION SELECT address FROM office) THEN
+        RAISE EXCEPTION 'Address % isnt a warehouse or an office', NEW.address;
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE CONSTRAINT TRIGGER insert_workplace_trigger AFTER INSERT ON workplace
+DEFERRABLE INITIALLY DEFERRED
+FOR EACH ROW EXECUTE FUNCTION insert_workplace_func();
+
+-- RI-3, as written in the notebook (0006 rewrites the checks)
+
+CREATE OR REPLACE FUNCTION remove_contains_func() RETURNS TRIGGER AS
+$$
+BEGIN
+    IF OLD.order_no IN (SELECT order_no FROM orders) THEN
+        RAISE EXCEPTION 'You need to remove the order from orders';
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE CONSTRAINT TRIGGER remove_contains_trigger AFTER DELETE ON contains
+DEFERRABLE INITIALLY DEFERRED
+FOR EACH ROW EXECUTE FUNCTION remove_contains_func();
+
+CREATE OR REPLACE FUNCTION insert_order_func() RETURNS TRIGGER AS
+$$
+BEGIN
+    IF NEW.order_no NOT IN (SELECT order_no FROM contains) THEN
+        RAISE EXCEPTION 'Order % doesnt have products.', NEW.order_no;
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE CONSTRAINT TRIGGER insert_order_trigger AFTER INSERT ON orders
+DEFERRABLE INITIALLY DEFERRED
+FOR EACH ROW EXECUTE FUNCTION insert_order_func();
+
+CREATE VIEW product_sales AS
+SELECT sku, order_no, qty, SUM(qty*price) AS total_price, EXTRACT(YEAR FROM date) AS year,
+    TO_CHAR(date,'Month') as month, EXTRACT(DAY FROM date) AS day_of_month,
+    TO_CHAR(date,'Day') as day_of_week, SUBSTRING(address, '[0-9]{4}-[0-9]{3}\s+(.*)$') AS city
+FROM contains
+    JOIN orders USING (order_no)
+    JOIN product USING (sku)
+    JOIN customer USING (cust_no)
+GROUP BY (sku,order_no,date,address)
+ORDER BY (qty) DESC;
@@ -0,0 +1,36 @@
+-- migrate: no-transaction
+-- Trigram indexes backing the search boxes of the list pages. GIN trigram
+-- indexes answer ILIKE '%term%' and similarity() without scanning the table;
+-- the ::text expression indexes cover searches on numeric keys.
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS customer_name_trgm_idx
+    ON customer USING gin (name gin_trgm_ops);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS customer_phone_trgm_idx
+    ON customer USING gin (phone gin_trgm_ops);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS customer_cust_no_trgm_idx
+    ON customer USING gin ((cust_no::text) gin_trgm_ops);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS product_name_trgm_idx
+    ON product USING gin (name gin_trgm_ops);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS product_sku_trgm_idx
+    ON product USING gin (sku gin_trgm_ops);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS product_price_trgm_idx
+    ON product USING gin ((price::text) gin_trgm_ops);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS product_ean_trgm_idx
+    ON product USING gin ((ean::text) gin_trgm_ops);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS supplier_name_trgm_idx
+    ON supplier USING gin (name gin_trgm_ops);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS supplier_tin_trgm_idx
+    ON supplier USING gin (tin gin_trgm_ops);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS supplier_sku_trgm_idx
+    ON supplier USING gin (sku gin_trgm_ops);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS orders_order_no_trgm_idx
+    ON orders USING gin ((order_no::text) gin_trgm_ops);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS orders_cust_no_trgm_idx
+    ON orders USING gin ((cust_no::text) gin_trgm_ops);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS orders_date_idx
+    ON orders (date);
@@ -0,0 +1,12 @@
+-- Let Postgres allocate customer and order numbers. Identity columns draw
+-- from a sequence, so concurrent inserts neither wait on each other nor
+-- collide the way SELECT MAX(...) + 1 does. BY DEFAULT keeps explicit keys
+-- (populate.sql, imports) working; the sequences start past existing data.
+
+ALTER TABLE customer ALTER COLUMN cust_no ADD GENERATED BY DEFAULT AS IDENTITY;
+SELECT setval(pg_get_serial_sequence('customer', 'cust_no'), COALESCE(MAX(cust_no), 0) + 1, false)
+FROM customer;
+
+ALTER TABLE orders ALTER COLUMN order_no ADD GENERATED BY DEFAULT AS IDENTITY;
+SELECT setval(pg_get_serial_sequence('orders', 'order_no'), COALESCE(MAX(order_no), 0) + 1, false)
+FROM orders;
@@ -0,0 +1,118 @@
+-- Materialized product sales. product_sales used to join contains, orders,
+-- product and customer and parse the city out of the address on every read;
+-- sales_fact stores that result, one row per order line, and triggers on the
+-- four base tables keep it current. The columns are the view's plus the
+-- order date, which the analytics cube is keyed on.
+
+CREATE OR REPLACE FUNCTION sales_fact_city(address VARCHAR) RETURNS TEXT AS
+$$
+    SELECT SUBSTRING(address, '[0-9]{4}-[0-9]{3}\s+(.*)$');
+$$ LANGUAGE sql IMMUTABLE;
+
+CREATE TABLE sales_fact (
+    sku VARCHAR(25) NOT NULL,
+    order_no INTEGER NOT NULL,
+    qty INTEGER,
+    total_price NUMERIC,
+    year INTEGER NOT NULL,
+    month TEXT NOT NULL,
+    day_of_month INTEGER NOT NULL,
+    day_of_week TEXT NOT NULL,
+    city TEXT,
+    date DATE NOT NULL,
+    PRIMARY KEY (order_no, sku)
+);
+
+CREATE INDEX sales_fact_year_month_sku_idx ON sales_fact (year, month, sku);
+CREATE INDEX sales_fact_city_idx ON sales_fact (city);
+CREATE INDEX sales_fact_sku_idx ON sales_fact (sku);
+
+-- (Re)build the fact rows of one order, or of one line when sku is given.
+CREATE OR REPLACE FUNCTION sales_fact_refresh(p_order_no INTEGER, p_sku VARCHAR DEFAULT NULL)
+RETURNS VOID AS
+$$
+BEGIN
+    DELETE FROM sales_fact
+    WHERE order_no = p_order_no AND (p_sku IS NULL OR sku = p_sku);
+
+    INSERT INTO sales_fact
+    SELECT c.sku, c.order_no, c.qty, c.qty * p.price,
+        EXTRACT(YEAR FROM o.date), TO_CHAR(o.date, 'Month'), EXTRACT(DAY FROM o.date),
+        TO_CHAR(o.date, 'Day'), sales_fact_city(cu.address), o.date
+    FROM contains c
+        JOIN orders o ON o.order_no = c.order_no
+        JOIN product p ON p.sku = c.sku
+        JOIN customer cu ON cu.cust_no = o.cust_no
+    WHERE c.order_no = p_order_no AND (p_sku IS NULL OR c.sku = p_sku);
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION sales_fact_contains_func() RETURNS TRIGGER AS
+$$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        DELETE FROM sales_fact WHERE order_no = OLD.order_no AND sku = OLD.sku;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM sales_fact_refresh(NEW.order_no, NEW.sku);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER sales_fact_contains_trigger AFTER INSERT OR UPDATE OR DELETE ON contains
+FOR EACH ROW EXECUTE FUNCTION sales_fact_contains_func();
+
+CREATE OR REPLACE FUNCTION sales_fact_orders_func() RETURNS TRIGGER AS
+$$
+BEGIN
+    PERFORM sales_fact_refresh(NEW.order_no);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER sales_fact_orders_trigger AFTER UPDATE OF date, cust_no ON orders
+FOR EACH ROW EXECUTE FUNCTION sales_fact_orders_func();
+
+CREATE OR REPLACE FUNCTION sales_fact_product_func() RETURNS TRIGGER AS
+$$
+BEGIN
+    UPDATE sales_fact SET total_price = qty * NEW.price WHERE sku = NEW.sku;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER sales_fact_product_trigger AFTER UPDATE OF price ON product
+FOR EACH ROW WHEN (OLD.price IS DISTINCT FROM NEW.price)
+EXECUTE FUNCTION sales_fact_product_func();
+
+CREATE OR REPLACE FUNCTION sales_fact_customer_func() RETURNS TRIGGER AS
+$$
+BEGIN
+    UPDATE sales_fact f SET city = sales_fact_city(NEW.address)
+    FROM orders o
+    WHERE o.cust_no = NEW.cust_no AND f.order_no = o.order_no;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER sales_fact_customer_trigger AFTER UPDATE OF address ON customer
+FOR EACH ROW WHEN (OLD.address IS DISTINCT FROM NEW.address)
+EXECUTE FUNCTION sales_fact_customer_func();
+
+INSERT INTO sales_fact
+SELECT c.sku, c.order_no, c.qty, c.qty * p.price,
+    EXTRACT(YEAR FROM o.date), TO_CHAR(o.date, 'Month'), EXTRACT(DAY FROM o.date),
+    TO_CHAR(o.date, 'Day'), sales_fact_city(cu.address), o.date
+FROM contains c
+    JOIN orders o ON o.order_no = c.order_no
+    JOIN product p ON p.sku = c.sku
+    JOIN customer cu ON cu.cust_no = o.cust_no;
+
+ANALYZE sales_fact;
+
+-- Existing OLAP queries keep reading product_sales, now from the fact table.
+DROP VIEW IF EXISTS product_sales;
+CREATE VIEW product_sales AS
+SELECT sku, order_no, qty, total_price, year, month, day_of_month, day_of_week, city
+FROM sales_fact;
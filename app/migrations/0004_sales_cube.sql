@@ -0,0 +1,116 @@
+-- Pre-aggregated sales for /analytics/sales. date_dim replaces the notebook's
+-- text-keyed "data" calendar with an integer YYYYMMDD key; sales_cube holds
+-- the daily quantity and value per product and city, maintained from
+-- sales_fact, so OLAP questions aggregate at most days x products x cities
+-- rows instead of cross joining the catalog with the calendar.
+
+CREATE TABLE date_dim (
+    date_key INTEGER PRIMARY KEY,
+    date DATE UNIQUE NOT NULL,
+    year INTEGER NOT NULL,
+    month INTEGER NOT NULL,
+    day_of_month INTEGER NOT NULL,
+    day_of_week INTEGER NOT NULL, -- ISO: 1 = Monday ... 7 = Sunday
+    month_name TEXT NOT NULL,
+    weekday_name TEXT NOT NULL
+);
+
+INSERT INTO date_dim
+SELECT TO_CHAR(d, 'YYYYMMDD')::INTEGER, d, EXTRACT(YEAR FROM d), EXTRACT(MONTH FROM d),
+    EXTRACT(DAY FROM d), EXTRACT(ISODOW FROM d), TRIM(TO_CHAR(d, 'Month')), TRIM(TO_CHAR(d, 'Day'))
+FROM GENERATE_SERIES('1990-01-01'::DATE, '2060-12-31'::DATE, '1 day'::INTERVAL) AS d;
+
+-- city is '' when the customer address has no recognisable city. date_key is
+-- deliberately not a foreign key: a sale outside date_dim's range must not
+-- make the order fail, it only stays out of the reports.
+CREATE TABLE sales_cube (
+    date_key INTEGER NOT NULL,
+    sku VARCHAR(25) NOT NULL,
+    city TEXT NOT NULL,
+    lines INTEGER NOT NULL,
+    qty BIGINT NOT NULL,
+    total_value NUMERIC NOT NULL,
+    PRIMARY KEY (date_key, sku, city)
+);
+
+CREATE INDEX sales_cube_sku_idx ON sales_cube (sku, date_key);
+
+-- The version of sales_cube, which readers cache results under, is the sum
+-- of these rows. They are updated in the writing transaction, so the version
+-- changes exactly when a write commits, and replicates with it. A writer
+-- bumps one of 16 rows, picked by backend, so concurrent orders rarely wait
+-- on each other's row lock.
+CREATE TABLE sales_cube_versions (
+    slot SMALLINT PRIMARY KEY,
+    version BIGINT NOT NULL
+);
+
+INSERT INTO sales_cube_versions (slot, version)
+SELECT slot, 0 FROM GENERATE_SERIES(0, 15) AS slot;
+
+CREATE OR REPLACE FUNCTION sales_cube_add(p_date DATE, p_sku VARCHAR, p_city TEXT,
+    p_lines INTEGER, p_qty INTEGER, p_value NUMERIC) RETURNS VOID AS
+$$
+BEGIN
+    INSERT INTO sales_cube AS c (date_key, sku, city, lines, qty, total_value)
+    VALUES (TO_CHAR(p_date, 'YYYYMMDD')::INTEGER, p_sku, COALESCE(p_city, ''),
+        p_lines, COALESCE(p_qty, 0), COALESCE(p_value, 0))
+    ON CONFLICT (date_key, sku, city) DO UPDATE
+    SET lines = c.lines + EXCLUDED.lines,
+        qty = c.qty + EXCLUDED.qty,
+        total_value = c.total_value + EXCLUDED.total_value;
+
+    IF p_lines < 0 THEN
+        DELETE FROM sales_cube
+        WHERE date_key = TO_CHAR(p_date, 'YYYYMMDD')::INTEGER
+            AND sku = p_sku AND city = COALESCE(p_city, '') AND lines = 0;
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION sales_cube_fact_func() RETURNS TRIGGER AS
+$$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM sales_cube_add(OLD.date, OLD.sku, OLD.city, -1, -OLD.qty, -OLD.total_price);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM sales_cube_add(NEW.date, NEW.sku, NEW.city, 1, NEW.qty, NEW.total_price);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER sales_cube_fact_trigger AFTER INSERT OR UPDATE OR DELETE ON sales_fact
+FOR EACH ROW EXECUTE FUNCTION sales_cube_fact_func();
+
+CREATE OR REPLACE FUNCTION sales_cube_version_func() RETURNS TRIGGER AS
+$$
+BEGIN
+    UPDATE sales_cube_versions SET version = version + 1 WHERE slot = pg_backend_pid() % 16;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Once per statement on the tables sales_fact follows (0003), not on
+-- sales_fact itself, where every contains row runs a DELETE and an INSERT.
+CREATE TRIGGER sales_cube_version_contains_trigger AFTER INSERT OR UPDATE OR DELETE ON contains
+FOR EACH STATEMENT EXECUTE FUNCTION sales_cube_version_func();
+
+CREATE TRIGGER sales_cube_version_orders_trigger AFTER UPDATE OF date, cust_no ON orders
+FOR EACH STATEMENT EXECUTE FUNCTION sales_cube_version_func();
+
+CREATE TRIGGER sales_cube_version_product_trigger AFTER UPDATE OF price ON product
+FOR EACH STATEMENT EXECUTE FUNCTION sales_cube_version_func();
+
+CREATE TRIGGER sales_cube_version_customer_trigger AFTER UPDATE OF address ON customer
+FOR EACH STATEMENT EXECUTE FUNCTION sales_cube_version_func();
+
+INSERT INTO sales_cube (date_key, sku, city, lines, qty, total_value)
+SELECT TO_CHAR(date, 'YYYYMMDD')::INTEGER, sku, COALESCE(city, ''),
+    COUNT(*), COALESCE(SUM(qty), 0), COALESCE(SUM(total_price), 0)
+FROM sales_fact
+GROUP BY 1, 2, 3;
+
+ANALYZE date_dim;
+ANALYZE sales_cube;
@@ -0,0 +1,37 @@
+-- migrate: no-transaction
+-- B-tree indexes for the hot queries and the foreign keys Postgres does not
+-- index by itself (section 6 of Entrega3.ipynb; orders.date already exists
+-- from 0001). Without them the delete handlers and the deferred RI checks
+-- scan orders, contains, pay, process, supplier and delivery on every call.
+
+-- price range filters and the notebook's price queries
+CREATE INDEX CONCURRENTLY IF NOT EXISTS product_price_idx
+    ON product (price);
+-- name prefix search (LIKE 'abc%' under any collation) and the product list,
+-- which pages on (name, sku)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS product_name_pattern_idx
+    ON product (name text_pattern_ops);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS product_name_sku_idx
+    ON product (name, sku);
+
+-- foreign keys: customer and product deletes, and the lookups by customer
+CREATE INDEX CONCURRENTLY IF NOT EXISTS orders_cust_no_idx
+    ON orders (cust_no);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS pay_cust_no_idx
+    ON pay (cust_no);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS contains_sku_idx
+    ON contains (sku);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS process_order_no_idx
+    ON process (order_no);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS supplier_sku_idx
+    ON supplier (sku);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS delivery_tin_idx
+    ON delivery (tin);
+
+ANALYZE product;
+ANALYZE orders;
+ANALYZE pay;
+ANALYZE contains;
+ANALYZE process;
+ANALYZE supplier;
+ANALYZE delivery;
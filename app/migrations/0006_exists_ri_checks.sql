@@ -0,0 +1,67 @@
+-- The notebook's RI-2 and RI-3 trigger functions test membership with
+-- IN (SELECT ...), which plans as a hashed subplan: every firing reads the
+-- whole of office, warehouse, workplace, orders or contains. Deleting a
+-- customer or a product fires remove_contains_trigger once per order line,
+-- so the deletes scaled with lines x table size. EXISTS probes the primary
+-- key (or, for contains, its leading order_no column) instead.
+
+CREATE OR REPLACE FUNCTION insert_warehouse_func() RETURNS TRIGGER AS
+$$
+BEGIN
+    IF EXISTS (SELECT 1 FROM office WHERE address = NEW.address) THEN
+        RAISE EXCEPTION 'Address % is from an office.', NEW.address;
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION remove_office_warehouse_func() RETURNS TRIGGER AS
+$$
+BEGIN
+    IF EXISTS (SELECT 1 FROM workplace WHERE address = OLD.address) THEN
+        RAISE EXCEPTION 'You need to remove the office/warehouse from workplace';
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION insert_office_func() RETURNS TRIGGER AS
+$$
+BEGIN
+    IF EXISTS (SELECT 1 FROM warehouse WHERE address = NEW.address) THEN
+        RAISE EXCEPTION 'Address % is from a warehouse.', NEW.address;
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION insert_workplace_func() RETURNS TRIGGER AS
+$$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM warehouse WHERE address = NEW.address)
+        AND NOT EXISTS (SELECT 1 FROM office WHERE address = NEW.address) THEN
+        RAISE EXCEPTION 'Address % isnt a warehouse or an office', NEW.address;
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION remove_contains_func() RETURNS TRIGGER AS
+$$
+BEGIN
+    IF EXISTS (SELECT 1 FROM orders WHERE order_no = OLD.order_no) THEN
+        RAISE EXCEPTION 'You need to remove the order from orders';
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION insert_order_func() RETURNS TRIGGER AS
+$$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM contains WHERE order_no = NEW.order_no) THEN
+        RAISE EXCEPTION 'Order % doesnt have products.', NEW.order_no;
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
@@ -0,0 +1,44 @@
+-- Tell the app's product catalog (catalog.py) which products changed. Every
+-- statement that writes to product sends one notification on
+-- product_changed, delivered at commit, whose payload is a JSON array of the
+-- SKUs it touched, or '' when it touched more than 100 (or truncated the
+-- table) and the catalog should reload everything.
+
+CREATE OR REPLACE FUNCTION product_notify_func() RETURNS TRIGGER AS
+$$
+DECLARE
+    skus VARCHAR[];
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        SELECT array_agg(sku) INTO skus FROM (SELECT sku FROM new_rows LIMIT 101) AS t;
+    ELSIF TG_OP = 'UPDATE' THEN
+        SELECT array_agg(sku) INTO skus
+        FROM (SELECT sku FROM old_rows UNION SELECT sku FROM new_rows LIMIT 101) AS t;
+    ELSIF TG_OP = 'DELETE' THEN
+        SELECT array_agg(sku) INTO skus FROM (SELECT sku FROM old_rows LIMIT 101) AS t;
+    END IF;
+
+    IF TG_OP = 'TRUNCATE' OR cardinality(skus) > 100 THEN
+        PERFORM pg_notify('product_changed', '');
+    ELSIF skus IS NOT NULL THEN
+        PERFORM pg_notify('product_changed', array_to_json(skus)::text);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Transition tables need one trigger per event.
+CREATE TRIGGER product_notify_insert_trigger AFTER INSERT ON product
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION product_notify_func();
+
+CREATE TRIGGER product_notify_update_trigger AFTER UPDATE ON product
+REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION product_notify_func();
+
+CREATE TRIGGER product_notify_delete_trigger AFTER DELETE ON product
+REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION product_notify_func();
+
+CREATE TRIGGER product_notify_truncate_trigger AFTER TRUNCATE ON product
+FOR EACH STATEMENT EXECUTE FUNCTION product_notify_func();
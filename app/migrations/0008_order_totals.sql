@@ -0,0 +1,59 @@
+-- What every order is worth. order_totals holds each order's line count,
+-- item count (sum of qty) and value, maintained from sales_fact, whose
+-- triggers already follow contains and product.price (0003); the order
+-- list and the JSON API read it instead of summing qty * price per order,
+-- and the largest-orders listing reads it in total order from the index.
+
+CREATE TABLE order_totals (
+    order_no INTEGER PRIMARY KEY,
+    lines INTEGER NOT NULL,
+    items BIGINT NOT NULL,
+    total NUMERIC NOT NULL
+);
+
+CREATE INDEX order_totals_total_idx ON order_totals (total, order_no);
+
+CREATE OR REPLACE FUNCTION order_totals_add(p_order_no INTEGER, p_lines INTEGER, p_items INTEGER,
+    p_total NUMERIC) RETURNS VOID AS
+$$
+BEGIN
+    INSERT INTO order_totals AS t (order_no, lines, items, total)
+    VALUES (p_order_no, p_lines, COALESCE(p_items, 0), COALESCE(p_total, 0))
+    ON CONFLICT (order_no) DO UPDATE
+    SET lines = t.lines + EXCLUDED.lines,
+        items = t.items + EXCLUDED.items,
+        total = t.total + EXCLUDED.total;
+
+    IF p_lines < 0 THEN
+        DELETE FROM order_totals WHERE order_no = p_order_no AND lines = 0;
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION order_totals_fact_func() RETURNS TRIGGER AS
+$$
+BEGIN
+    IF TG_OP = 'UPDATE' AND OLD.order_no = NEW.order_no THEN
+        PERFORM order_totals_add(NEW.order_no, 0, COALESCE(NEW.qty, 0) - COALESCE(OLD.qty, 0),
+            COALESCE(NEW.total_price, 0) - COALESCE(OLD.total_price, 0));
+        RETURN NULL;
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM order_totals_add(OLD.order_no, -1, -OLD.qty, -OLD.total_price);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM order_totals_add(NEW.order_no, 1, NEW.qty, NEW.total_price);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER order_totals_fact_trigger AFTER INSERT OR UPDATE OR DELETE ON sales_fact
+FOR EACH ROW EXECUTE FUNCTION order_totals_fact_func();
+
+INSERT INTO order_totals (order_no, lines, items, total)
+SELECT order_no, COUNT(*), COALESCE(SUM(qty), 0), COALESCE(SUM(total_price), 0)
+FROM sales_fact
+GROUP BY order_no;
+
+ANALYZE order_totals;
@@ -0,0 +1,165 @@
+-- Paid revenue per customer, for /clients/top. The notebook's "customer
+-- with the highest total paid orders" compares every customer's sum with
+-- every other's (HAVING SUM(...) >= ALL (...)); these tables hold the sums:
+-- customer_revenue_daily per paying customer and order date, for date
+-- ranges, and customer_revenue per customer overall, whose index answers the
+-- top N without aggregating. An order's value comes from order_totals (0008),
+-- so both follow pay, contains and product.price, and orders.date.
+--
+-- customer_revenue_orders records, per paid order, the customer, date and
+-- value that were added to the sums, and every decrement subtracts what it
+-- finds there. The triggers never read orders or order_totals to take an
+-- order out: when one statement deletes an order together with its lines and
+-- payment (delete_product_orders' CTE), every AFTER ROW trigger fires once
+-- the statement is done, and those rows are gone by then.
+
+CREATE TABLE customer_revenue_daily (
+    date DATE NOT NULL,
+    cust_no INTEGER NOT NULL,
+    orders INTEGER NOT NULL,
+    revenue NUMERIC NOT NULL,
+    PRIMARY KEY (date, cust_no)
+);
+
+CREATE TABLE customer_revenue (
+    cust_no INTEGER PRIMARY KEY,
+    orders INTEGER NOT NULL,
+    revenue NUMERIC NOT NULL
+);
+
+CREATE INDEX customer_revenue_revenue_idx ON customer_revenue (revenue DESC, cust_no);
+
+CREATE TABLE customer_revenue_orders (
+    order_no INTEGER PRIMARY KEY,
+    cust_no INTEGER NOT NULL,
+    date DATE NOT NULL,
+    total NUMERIC NOT NULL
+);
+
+CREATE OR REPLACE FUNCTION customer_revenue_add(p_cust_no INTEGER, p_date DATE, p_orders INTEGER,
+    p_revenue NUMERIC) RETURNS VOID AS
+$$
+BEGIN
+    INSERT INTO customer_revenue_daily AS r (date, cust_no, orders, revenue)
+    VALUES (p_date, p_cust_no, p_orders, COALESCE(p_revenue, 0))
+    ON CONFLICT (date, cust_no) DO UPDATE
+    SET orders = r.orders + EXCLUDED.orders,
+        revenue = r.revenue + EXCLUDED.revenue;
+
+    INSERT INTO customer_revenue AS r (cust_no, orders, revenue)
+    VALUES (p_cust_no, p_orders, COALESCE(p_revenue, 0))
+    ON CONFLICT (cust_no) DO UPDATE
+    SET orders = r.orders + EXCLUDED.orders,
+        revenue = r.revenue + EXCLUDED.revenue;
+
+    IF p_orders < 0 THEN
+        DELETE FROM customer_revenue_daily WHERE date = p_date AND cust_no = p_cust_no AND orders = 0;
+        DELETE FROM customer_revenue WHERE cust_no = p_cust_no AND orders = 0;
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+-- A payment adds its order's value, under the paying customer. The order's
+-- date and value are read when the payment is made, which is never in the
+-- statement that deletes the order.
+CREATE OR REPLACE FUNCTION customer_revenue_pay_func() RETURNS TRIGGER AS
+$$
+DECLARE
+    v_paid customer_revenue_orders;
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        DELETE FROM customer_revenue_orders WHERE order_no = OLD.order_no RETURNING * INTO v_paid;
+        IF FOUND THEN
+            PERFORM customer_revenue_add(v_paid.cust_no, v_paid.date, -1, -v_paid.total);
+        END IF;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO customer_revenue_orders (order_no, cust_no, date, total)
+        SELECT NEW.order_no, NEW.cust_no, o.date, COALESCE(t.total, 0)
+        FROM orders o LEFT JOIN order_totals t ON t.order_no = o.order_no
+        WHERE o.order_no = NEW.order_no
+        RETURNING * INTO v_paid;
+        IF FOUND THEN
+            PERFORM customer_revenue_add(v_paid.cust_no, v_paid.date, 1, v_paid.total);
+        END IF;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER customer_revenue_pay_trigger AFTER INSERT OR UPDATE OR DELETE ON pay
+FOR EACH ROW EXECUTE FUNCTION customer_revenue_pay_func();
+
+-- Lines added to, changed on or removed from a paid order change its value.
+CREATE OR REPLACE FUNCTION customer_revenue_totals_func() RETURNS TRIGGER AS
+$$
+DECLARE
+    v_order_no INTEGER;
+    v_delta NUMERIC;
+    v_paid customer_revenue_orders;
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        v_order_no := NEW.order_no;
+        v_delta := NEW.total;
+    ELSIF TG_OP = 'UPDATE' THEN
+        v_order_no := NEW.order_no;
+        v_delta := NEW.total - OLD.total;
+    ELSE
+        v_order_no := OLD.order_no;
+        v_delta := -OLD.total;
+    END IF;
+
+    IF v_delta <> 0 THEN
+        UPDATE customer_revenue_orders SET total = total + v_delta
+        WHERE order_no = v_order_no
+        RETURNING * INTO v_paid;
+        IF FOUND THEN
+            PERFORM customer_revenue_add(v_paid.cust_no, v_paid.date, 0, v_delta);
+        END IF;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER customer_revenue_totals_trigger AFTER INSERT OR UPDATE OR DELETE ON order_totals
+FOR EACH ROW EXECUTE FUNCTION customer_revenue_totals_func();
+
+-- A paid order moved to another day moves its revenue with it.
+CREATE OR REPLACE FUNCTION customer_revenue_orders_func() RETURNS TRIGGER AS
+$$
+DECLARE
+    v_paid customer_revenue_orders;
+BEGIN
+    SELECT * INTO v_paid FROM customer_revenue_orders WHERE order_no = NEW.order_no;
+    IF FOUND THEN
+        PERFORM customer_revenue_add(v_paid.cust_no, v_paid.date, -1, -v_paid.total);
+        UPDATE customer_revenue_orders SET date = NEW.date WHERE order_no = NEW.order_no;
+        PERFORM customer_revenue_add(v_paid.cust_no, NEW.date, 1, v_paid.total);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER customer_revenue_orders_trigger AFTER UPDATE OF date ON orders
+FOR EACH ROW WHEN (OLD.date IS DISTINCT FROM NEW.date)
+EXECUTE FUNCTION customer_revenue_orders_func();
+
+INSERT INTO customer_revenue_orders (order_no, cust_no, date, total)
+SELECT p.order_no, p.cust_no, o.date, COALESCE(t.total, 0)
+FROM pay p
+    JOIN orders o ON o.order_no = p.order_no
+    LEFT JOIN order_totals t ON t.order_no = p.order_no;
+
+INSERT INTO customer_revenue_daily (date, cust_no, orders, revenue)
+SELECT date, cust_no, COUNT(*), SUM(total)
+FROM customer_revenue_orders
+GROUP BY date, cust_no;
+
+INSERT INTO customer_revenue (cust_no, orders, revenue)
+SELECT cust_no, SUM(orders), SUM(revenue)
+FROM customer_revenue_daily
+GROUP BY cust_no;
+
+ANALYZE customer_revenue_orders;
+ANALYZE customer_revenue_daily;
+ANALYZE customer_revenue;
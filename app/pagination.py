@@ -0,0 +1,125 @@
+"""Keyset (seek) pagination helpers.
+
+Pages are addressed by an opaque cursor holding the sort key of the row at
+the edge of the previous page, so fetching page N costs the same as fetching
+page 1: Postgres seeks straight to the key through the index instead of
+scanning and discarding ``(N - 1) * limit`` rows like ``OFFSET`` does.
+
+Cursors come from clients, so a key may not fit its columns. Key values are
+sent as untyped text, which Postgres casts to the column's type, and a value
+that does not cast gives the first page, as a malformed cursor does.
+"""
+import base64
+import binascii
+import json
+from collections import namedtuple
+
+import psycopg
+
+
+PAGE_SIZE = 5
+
+Page = namedtuple("Page", "items page_number next_cursor prev_cursor")
+
+
+def encode_cursor(key, page_number, direction):
+    """Pack a sort key into an opaque, URL-safe cursor token."""
+    payload = json.dumps({"k": list(key), "p": page_number, "d": direction}, default=str)
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token):
+    """Unpack a cursor token, returning ``None`` if it is missing or malformed."""
+    if not token:
+        return None
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        key, page_number, direction = payload["k"], int(payload["p"]), payload["d"]
+    except (binascii.Error, ValueError, KeyError, TypeError):
+        return None
+    if direction not in ("next", "prev") or not isinstance(key, list) or page_number < 1:
+        return None
+    if not all(isinstance(value, (str, int)) and not isinstance(value, bool) for value in key):
+        return None
+    return key, page_number, direction
+
+
+def _statement(select, keys, cursor, limit, descending=False):
+    """SQL and parameters for one page, with the page's number and direction."""
+    decoded = decode_cursor(cursor)
+    columns = ", ".join(expr for expr, _ in keys)
+    placeholders = ", ".join(["%s"] * len(keys))
+    forward = ", ".join(f"{expr} DESC" if descending else expr for expr, _ in keys)
+    backward = ", ".join(expr if descending else f"{expr} DESC" for expr, _ in keys)
+    after, before = ("<", ">") if descending else (">", "<")
+
+    if decoded is None or len(decoded[0]) != len(keys):
+        return f"{select} ORDER BY {forward} LIMIT %s;", (limit + 1,), 1, "next"
+
+    key, page_number, direction = decoded
+    if direction == "next":
+        sql = f"{select} WHERE ({columns}) {after} ({placeholders}) ORDER BY {forward} LIMIT %s;"
+    else:
+        sql = f"{select} WHERE ({columns}) {before} ({placeholders}) ORDER BY {backward} LIMIT %s;"
+    return sql, (*(str(value) for value in key), limit + 1), page_number, direction
+
+
+def _page(rows, keys, limit, page_number, direction):
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if direction == "prev":
+        rows.reverse()
+        if not has_more:
+            # Walked back past the start of the table: this is the first page.
+            page_number = 1
+
+    def key_of(row):
+        return [row[attr] if isinstance(attr, int) else getattr(row, attr) for _, attr in keys]
+
+    next_cursor = prev_cursor = None
+    if rows:
+        if has_more or direction == "prev":
+            next_cursor = encode_cursor(key_of(rows[-1]), page_number + 1, "next")
+        if page_number > 1:
+            prev_cursor = encode_cursor(key_of(rows[0]), page_number - 1, "prev")
+    return Page(rows, page_number, next_cursor, prev_cursor)
+
+
+def fetch_page(cur, select, keys, cursor=None, limit=PAGE_SIZE, prepare=None, descending=False):
+    """Fetch one page of ``select`` ordered by ``keys``.
+
+    ``select`` is a ``SELECT ... FROM ...`` without WHERE/ORDER BY/LIMIT and
+    ``keys`` is a list of ``(sql_expression, row_attribute)`` pairs forming a
+    unique, non-null sort key, e.g. ``[("o.order_no", "order_no")]``; for
+    tuple rows the attribute is the column's index instead. One
+    extra row is read to find out whether a page exists past the one returned.
+    ``descending`` pages from the largest key down. ``prepare`` is passed on
+    to ``cur.execute``.
+    """
+    sql, params, page_number, direction = _statement(select, keys, cursor, limit, descending)
+    if len(params) == 1:  # no key from a cursor
+        rows = cur.execute(sql, params, prepare=prepare).fetchall()
+    else:
+        try:
+            # a savepoint, so a key that fails to cast only undoes this query
+            with cur.connection.transaction():
+                rows = cur.execute(sql, params, prepare=prepare).fetchall()
+        except psycopg.DataError:
+            return fetch_page(cur, select, keys, None, limit, prepare, descending)
+    return _page(rows, keys, limit, page_number, direction)
+
+
+async def fetch_page_async(cur, select, keys, cursor=None, limit=PAGE_SIZE, prepare=None, descending=False):
+    """``fetch_page`` for an ``AsyncCursor``."""
+    sql, params, page_number, direction = _statement(select, keys, cursor, limit, descending)
+    if len(params) == 1:
+        await cur.execute(sql, params, prepare=prepare)
+        return _page(await cur.fetchall(), keys, limit, page_number, direction)
+    try:
+        async with cur.connection.transaction():
+            await cur.execute(sql, params, prepare=prepare)
+            rows = await cur.fetchall()
+    except psycopg.DataError:
+        return await fetch_page_async(cur, select, keys, None, limit, prepare, descending)
+    return _page(rows, keys, limit, page_number, direction)
@@ -0,0 +1,173 @@
+"""Ranked, bounded search over the list pages.
+
+Every searchable column has a trigram index (see
+``migrations/0001_search_indexes.sql``), so ``ILIKE '%term%'`` is answered
+from the index and ``similarity()`` ranks the matches. Results are paged and
+both the pages and the reported total are capped: a vague query costs at most
+``MAX_RESULTS`` matched rows instead of the whole table. Only the first
+``MAX_RESULTS`` matches the index yields are ranked, so a query that matches
+more is ranked within those. Past the cap, the planner's estimate of the
+total is reported as well (see ``counts.py``).
+"""
+import asyncio
+import datetime
+from collections import namedtuple
+
+from psycopg.rows import tuple_row
+
+from counts import planner_rows, planner_rows_async
+
+
+PAGE_SIZE = 5
+MAX_RESULTS = 1000  # deepest match reachable through the pages, and count cap
+
+# total stops at MAX_RESULTS (capped is then true); estimate is the exact
+# total, or the planner's estimate of it when capped.
+SearchResult = namedtuple("SearchResult", "items page_number has_next total capped estimate")
+
+# select list, FROM clause, searched expressions and tie-breaking order (the
+# primary key) per entity; the expressions are exactly the ones indexed by the
+# migration.
+ENTITIES = {
+    "customer": (
+        "cust_no, name, address, phone",
+        "customer",
+        ["name", "phone", "cust_no::text"],
+        "cust_no",
+    ),
+    "product": (
+        "sku, name, description, price, ean",
+        "product",
+        ["name", "sku", "price::text", "ean::text"],
+        "sku",
+    ),
+    "supplier": (
+        "sku, address, name, tin, date",
+        "supplier",
+        ["name", "tin", "sku"],
+        "tin",
+    ),
+    "orders": (
+        "o.order_no, o.cust_no, o.date, p.order_no IS NOT NULL AS is_paid, t.total, t.items",
+        "orders o LEFT JOIN pay p ON o.order_no = p.order_no LEFT JOIN order_totals t ON o.order_no = t.order_no",
+        ["o.order_no::text", "o.cust_no::text"],
+        "o.order_no",
+    ),
+}
+
+
+def like_pattern(query):
+    """``%query%`` with LIKE wildcards in the user's text escaped."""
+    escaped = query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+def date_range(query):
+    """The ``[start, end)`` dates an ISO year, month or day query refers to."""
+    for fmt, step in (("%Y-%m-%d", "day"), ("%Y-%m", "month"), ("%Y", "year")):
+        try:
+            start = datetime.datetime.strptime(query, fmt).date()
+        except ValueError:
+            continue
+        if step == "day":
+            return start, start + datetime.timedelta(days=1)
+        if step == "month":
+            return start, (start.replace(day=28) + datetime.timedelta(days=4)).replace(day=1)
+        return start, start.replace(year=start.year + 1)
+    return None
+
+
+def _statements(entity, query, page_number, limit, columns=None):
+    """The page query, the capped count query and the uncapped match query
+    (for estimates), each with its parameters."""
+    default_columns, source, expressions, tiebreak = ENTITIES[entity]
+    columns = columns or default_columns
+    query = query.strip()
+    params = {"pattern": like_pattern(query), "query": query}
+
+    conditions = [f"{expr} ILIKE %(pattern)s" for expr in expressions]
+    if entity == "orders":
+        dates = date_range(query)
+        if dates:
+            conditions.append("(o.date >= %(date_from)s AND o.date < %(date_to)s)")
+            params["date_from"], params["date_to"] = dates
+    where = " OR ".join(conditions)
+    rank = ", ".join(f"COALESCE(similarity({expr}, %(query)s), 0)" for expr in expressions)
+
+    # similarity() is only computed for the candidates, not for every match
+    rows = (
+        f"""
+        SELECT {columns}
+        FROM {source}
+        WHERE {tiebreak} IN (
+            SELECT {tiebreak} FROM {source} WHERE {where} LIMIT %(cap)s
+        )
+        ORDER BY GREATEST({rank}) DESC, {tiebreak}
+        LIMIT %(limit)s OFFSET %(offset)s;
+        """,
+        {**params, "cap": MAX_RESULTS, "limit": limit + 1, "offset": (page_number - 1) * limit},
+    )
+    total = (
+        f"""
+        SELECT COUNT(*) FROM (
+            SELECT 1 FROM {source} WHERE {where} LIMIT %(cap)s
+        ) AS matches;
+        """,
+        {**params, "cap": MAX_RESULTS + 1},
+    )
+    matches = (f"SELECT 1 FROM {source} WHERE {where}", params)
+    return rows, total, matches
+
+
+def _result(rows, total, page_number, limit, estimate=None):
+    has_next = len(rows) > limit and page_number * limit < MAX_RESULTS
+    capped = total > MAX_RESULTS
+    estimate = max(estimate or 0, total) if capped else total
+    return SearchResult(rows[:limit], page_number, has_next, min(total, MAX_RESULTS), capped, estimate)
+
+
+def search(cur, entity, query, page_number=1, limit=PAGE_SIZE, prepare=None, columns=None):
+    """Return one page of ``entity`` rows matching ``query``, best match first.
+
+    ``columns`` replaces the entity's select list.
+    """
+    page_number = max(1, min(page_number, MAX_RESULTS // limit))
+    (rows_sql, rows_params), (total_sql, total_params), matches = _statements(
+        entity, query, page_number, limit, columns
+    )
+    rows = cur.execute(rows_sql, rows_params, prepare=prepare).fetchall()
+    total = cur.execute(total_sql, total_params, prepare=prepare).fetchone()[0]
+    estimate = planner_rows(cur, *matches) if total > MAX_RESULTS else None
+    return _result(rows, total, page_number, limit, estimate)
+
+
+async def search_async(
+    pool, entity, query, page_number=1, limit=PAGE_SIZE, prepare=None, row_factory=None, columns=None
+):
+    """``search`` over an ``AsyncConnectionPool``.
+
+    The page and the count are independent, so they run at the same time on
+    two connections of ``pool``.
+    """
+    page_number = max(1, min(page_number, MAX_RESULTS // limit))
+    (rows_sql, rows_params), (total_sql, total_params), matches = _statements(
+        entity, query, page_number, limit, columns
+    )
+
+    async def fetch(sql, params, factory):
+        async with pool.connection() as conn:
+            async with conn.cursor(row_factory=factory) as cur:
+                await cur.execute(sql, params, prepare=prepare)
+                return await cur.fetchall()
+
+    rows, total = await asyncio.gather(
+        fetch(rows_sql, rows_params, row_factory or tuple_row),
+        fetch(total_sql, total_params, tuple_row),
+    )
+    total = total[0][0]
+    estimate = None
+    if total > MAX_RESULTS:
+        async with pool.connection() as conn:
+            async with conn.cursor() as cur:
+                estimate = await planner_rows_async(cur, *matches)
+    return _result(rows, total, page_number, limit, estimate)
@@ -0,0 +1,85 @@
+"""Validation rules shared by the form handlers and the bulk importer.
+
+Each ``clean_*`` function takes the raw text fields of one record and returns
+``(values, error)``: the values ready to be inserted, and the message to show
+(``None`` when the record is valid). Like the original handlers, when several
+rules fail the last one checked is the one reported.
+"""
+import datetime
+
+
+CUSTOMER_FIELDS = ("name", "email", "phone", "address")
+PRODUCT_FIELDS = ("sku", "name", "description", "price", "ean")
+SUPPLIER_FIELDS = ("tin", "name", "address", "sku", "date")
+
+
+def _too_long(values, limits):
+    for field, limit in limits.items():
+        if values[field] is not None and len(values[field]) > limit:
+            return f"{field.capitalize()} is too long (max {limit} characters)!"
+    return None
+
+
+def clean_customer(name, email, phone, address):
+    error = None
+    if not name:
+        error = "Name is required!"
+    if not email:
+        error = "Email is required!"
+    if "@" not in email or "." not in email:
+        error = "Email is invalid!"
+    if phone:
+        if phone.isnumeric() == False:
+            error = "Phone must be a number!"
+
+    values = {"name": name, "email": email, "phone": phone, "address": address or None}
+    error = _too_long(values, {"name": 80, "email": 254, "phone": 15, "address": 255}) or error
+    return values, error
+
+
+def clean_product(sku, name, description, price, ean):
+    error = None
+    if ean == "":
+        ean = None
+    if not name:
+        error = "Name is required!"
+    if not price:
+        error = "Price is required!"
+    try:
+        price = float(price)
+    except:
+        error = "Price must be a float"
+    else:
+        if not abs(price) < 10**8:  # NUMERIC(10, 2); also rejects nan/inf
+            error = "Price is too large!"
+    if ean is not None and not (ean.isdigit() and len(ean) <= 13):
+        error = "EAN must be a number of at most 13 digits!"
+    if not sku:
+        error = "SKU is required!"
+    if not description:
+        description = ""
+
+    values = {"sku": sku, "name": name, "description": description, "price": price, "ean": ean}
+    error = _too_long(values, {"sku": 25, "name": 200}) or error
+    return values, error
+
+
+def clean_supplier(tin, name, address, sku, date):
+    error = None
+    if name == "":
+        name = None
+    if address == "":
+        address = None
+    if sku == "":
+        sku = None
+    if date == "":
+        date = None
+    if date is not None:
+        try:
+            date = datetime.date.fromisoformat(date.replace("/", "-"))
+        except ValueError:
+            error = "Date is invalid!"
+
+    values = {"tin": tin, "name": name, "address": address, "sku": sku, "date": date}
+    error = _too_long(values, {"tin": 20, "name": 200, "address": 255, "sku": 25}) or error
+    return values, error